@@ -0,0 +1,49 @@
+"""Сравнение двух JSON с результатами бенчмарков.
+
+    python benchmarks/compare.py benchmarks/results/micro-main.json benchmarks/results/micro.json --threshold 15
+
+Завершается с ошибкой, если медиана какого-либо бенчмарка выросла больше
+чем на --threshold процентов.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        payload = json.load(f)
+    return payload, {b['name']: b['stats'] for b in payload['benchmarks'] if 'stats' in b}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10, help='допустимый рост медианы, %%')
+    parser.add_argument('--metric', default='median', choices=['min', 'median', 'mean', 'p95', 'p99'])
+    args = parser.parse_args()
+
+    base_payload, base = load(args.baseline)
+    current_payload, current = load(args.current)
+    print(f"{base_payload['commit_info']['id'][:10]} -> {current_payload['commit_info']['id'][:10]}, "
+          f"метрика {args.metric}")
+
+    regressions = []
+    for name in sorted(base.keys() & current.keys()):
+        before = base[name][args.metric]
+        after = current[name][args.metric]
+        change = (after - before) / before * 100 if before else 0.0
+        mark = ''
+        if change > args.threshold:
+            mark = '  РЕГРЕССИЯ'
+            regressions.append(name)
+        print(f'{name:<44} {before * 1000:>10.2f} мс -> {after * 1000:>10.2f} мс {change:>+8.1f}%{mark}')
+    for name in sorted(base.keys() ^ current.keys()):
+        print(f'{name:<44} есть только в {"baseline" if name in base else "current"}')
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
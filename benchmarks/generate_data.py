@@ -0,0 +1,107 @@
+"""Генератор синтетической базы яйценоскости для бенчмарков.
+
+Данные детерминированы: одинаковые --seed, --users, --years и --end дают
+одинаковую базу. Запуск из корня репозитория:
+
+    python benchmarks/generate_data.py --users 10000 --years 5
+    python benchmarks/generate_data.py --db /tmp/egg_database.db --users 100 --years 1 --reset
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from harness import DEFAULT_DB, use_source_tree
+
+use_source_tree()
+from tenhens_core import anomalies, storage
+
+NOTES = (
+    'новый корм', 'жара', 'холодно', 'линька', 'добавили мел', 'сменили подстилку',
+    'курица заболела', 'выпускали гулять', 'дождь', 'мало света', 'новая несушка',
+)
+BATCH_SIZE = 50000
+
+
+def user_rows(user_id, seed, start, days, notes_ratio):
+    """Записи одного пользователя: (user_id, date, count, notes)"""
+    rnd = random.Random(f'{seed}:{user_id}')
+    hens = rnd.randint(3, 30)
+    # Часть пользователей начинает вести учёт позже начала периода
+    first_day = rnd.randint(0, days // 3) if rnd.random() < 0.3 else 0
+    for offset in range(first_day, days):
+        if rnd.random() < 0.03:  # пропущенный день
+            continue
+        day = start + timedelta(days=offset)
+        # Сезонность: летом кладка выше, зимой ниже
+        rate = 0.65 + 0.2 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 80) / 365)
+        expected = hens * rate
+        count = max(0, min(hens, round(rnd.gauss(expected, math.sqrt(expected * (1 - rate))))))
+        notes = rnd.choice(NOTES) if rnd.random() < notes_ratio else ''
+        # Изредка за день вносится две записи: утро и вечер
+        if rnd.random() < 0.05 and count > 1:
+            morning = count // 2
+            yield (user_id, day.isoformat(), morning, notes)
+            yield (user_id, day.isoformat(), count - morning, '')
+        else:
+            yield (user_id, day.isoformat(), count, notes)
+
+
+def generate(db_path, users, years, seed, first_user_id, end, notes_ratio):
+    conn = sqlite3.connect(db_path)
+    storage.init_schema(conn)
+    # Для загрузки надёжность не нужна, а скорость важна
+    conn.execute('PRAGMA synchronous=OFF')
+
+    days = int(years * 365)
+    start = end - timedelta(days=days - 1)
+    total = 0
+    batch = []
+    for user_id in range(first_user_id, first_user_id + users):
+        for row in user_rows(user_id, seed, start, days, notes_ratio):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                conn.executemany('INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, ?, ?)', batch)
+                total += len(batch)
+                batch.clear()
+    if batch:
+        conn.executemany('INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, ?, ?)', batch)
+        total += len(batch)
+    # Записи вставлялись в обход storage.add_record: итоги считаются один раз в конце
+    storage.rebuild_activity(conn)
+    anomalies.reset(conn)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=DEFAULT_DB, help='путь к базе SQLite')
+    parser.add_argument('--users', type=int, default=100, help='число пользователей')
+    parser.add_argument('--years', type=float, default=1, help='глубина истории в годах')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--first-user-id', type=int, default=1000, help='user_id первого пользователя')
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today(),
+                        help='последний день истории, ГГГГ-ММ-ДД (по умолчанию сегодня)')
+    parser.add_argument('--notes-ratio', type=float, default=0.1, help='доля записей с заметкой')
+    parser.add_argument('--reset', action='store_true', help='удалить существующую базу')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    if args.reset:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    started = time.perf_counter()
+    total = generate(args.db, args.users, args.years, args.seed, args.first_user_id, args.end, args.notes_ratio)
+    print(f'{args.db}: {total} записей для {args.users} пользователей за {time.perf_counter() - started:.1f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Общие части бенчмарков: замеры, сводная статистика и запись результатов в JSON.
+
+Формат JSON повторяет pytest-benchmark (machine_info, commit_info, benchmarks),
+поэтому результаты разных коммитов сравниваются benchmarks/compare.py.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(ROOT, 'benchmarks', 'data', 'egg_database.db')
+
+
+def use_source_tree(*app_dirs):
+    """Подключить tenhens_core из core/ и каталоги приложений без установки"""
+    for path in (os.path.join(ROOT, 'core'),) + tuple(os.path.join(ROOT, d) for d in app_dirs):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def summarize(samples):
+    """Статистика по замерам в секундах"""
+    ordered = sorted(samples)
+    mean = statistics.fmean(ordered)
+    return {
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': mean,
+        'median': statistics.median(ordered),
+        'stddev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+        'rounds': len(ordered),
+        'ops': 1 / mean if mean else 0.0,
+    }
+
+
+def bench(func, args_cycle, rounds, warmup=2):
+    """Вызвать func по очереди с аргументами из args_cycle и вернуть статистику"""
+    for i in range(warmup):
+        func(*args_cycle[i % len(args_cycle)])
+    samples = []
+    for i in range(rounds):
+        args = args_cycle[i % len(args_cycle)]
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def write_results(path, results, params):
+    """Записать результаты; results - список {'name', 'group', 'stats', ...}"""
+    payload = {
+        'machine_info': {
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'commit_info': {
+            'id': _git('rev-parse', 'HEAD'),
+            'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        },
+        'params': params,
+        'datetime': datetime.now().isoformat(timespec='seconds'),
+        'benchmarks': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def print_results(results):
+    print(f"{'бенчмарк':<44} {'медиана, мс':>12} {'p95, мс':>10} {'оп/с':>10}")
+    for result in results:
+        if 'skipped' in result:
+            print(f"{result['name']:<44} пропущен: {result['skipped']}")
+            continue
+        s = result['stats']
+        print(f"{result['name']:<44} {s['median'] * 1000:>12.2f} {s['p95'] * 1000:>10.2f} {s['ops']:>10.1f}")
+
+
+def sample_user_ids(conn, count):
+    """Детерминированная выборка пользователей, у которых есть записи"""
+    user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM eggs ORDER BY user_id')]
+    if not user_ids:
+        raise SystemExit('В базе нет записей: сначала запустите benchmarks/generate_data.py')
+    step = max(1, len(user_ids) // count)
+    return user_ids[::step][:count]
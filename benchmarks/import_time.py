@@ -0,0 +1,80 @@
+"""Проверка холодного старта веб-приложения и бота через python -X importtime.
+
+Запуск из корня репозитория (нужны зависимости соответствующего приложения,
+пакет tenhens_core подключается из core/):
+
+    python benchmarks/import_time.py fullstack
+    python benchmarks/import_time.py chicken_bot --budget-ms 1500
+
+Скрипт завершается с ошибкой, если при импорте модуля подгрузился тяжёлый
+научный стек или суммарное время импорта превысило бюджет.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Каталог приложения -> модуль и бюджет времени импорта по умолчанию, мс
+TARGETS = {
+    'fullstack': ('app', 800),
+    'chicken_bot': ('chicken_bot', 1500),
+}
+
+# Эти пакеты должны загружаться только при первом построении графика или аналитики
+HEAVY_MODULES = ('pandas', 'numpy', 'scipy', 'matplotlib', 'openpyxl')
+
+
+def measure(target):
+    module, _ = TARGETS[target]
+    env = dict(os.environ)
+    env.setdefault('TELEGRAM_BOT_TOKEN', 'importtime-check')
+    # Общий пакет берётся из исходников, если он не установлен
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.join(ROOT, 'core'), env.get('PYTHONPATH')]))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.join(ROOT, target),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f'Импорт {target}/{module} завершился ошибкой:\n{result.stderr}')
+
+    # Строки вида "import time:  self [us] | cumulative | imported package"
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        imported[name.strip()] = int(cumulative_us)
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('target', choices=sorted(TARGETS))
+    parser.add_argument('--budget-ms', type=int, help='бюджет времени импорта модуля')
+    args = parser.parse_args()
+
+    module, default_budget = TARGETS[args.target]
+    budget_ms = args.budget_ms or default_budget
+    imported = measure(args.target)
+
+    total_ms = imported.get(module, 0) / 1000
+    heavy = sorted({name.split('.')[0] for name in imported} & set(HEAVY_MODULES))
+
+    print(f'{args.target}: импорт {module} занял {total_ms:.0f} мс (бюджет {budget_ms} мс)')
+    failed = False
+    if heavy:
+        print(f'ОШИБКА: при старте загружены тяжёлые модули: {", ".join(heavy)}')
+        failed = True
+    if total_ms > budget_ms:
+        print('ОШИБКА: превышен бюджет времени импорта')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Нагрузочный тест веб-API и обработчиков бота на сгенерированной базе.
+
+    python benchmarks/load_test.py web --requests 2000 --concurrency 8 --json benchmarks/results/web.json
+    python benchmarks/load_test.py bot --iterations 50 --json benchmarks/results/bot.json
+
+web - запросы через тестовый клиент Flask (fullstack/app.py) с JWT выбранных
+пользователей, без сети и gunicorn. bot - обработчики chicken_bot.py с
+поддельными Update, напоминания считаются, но не отправляются.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from harness import DEFAULT_DB, print_results, sample_user_ids, summarize, use_source_tree, write_results
+
+# ==================== WEB ====================
+
+WEB_ENDPOINTS = {
+    'records': '/api/records',
+    'records_30d': '/api/records?min_date={month_ago}',
+    'stats': '/api/stats?days=7',
+    'analytics': '/api/analytics?days=30',
+    'plot': '/api/plot?days=30',
+    'series': '/api/series?days=365&delta=1',
+    'summary': '/api/summary',
+    'dashboard': '/api/dashboard?days=7',
+}
+
+
+def load_web_app(db_path, response_cache):
+    use_source_tree('fullstack')
+    web = importlib.import_module('app')
+    web.DB_NAME = db_path
+    if not response_cache:
+        web.response_cache.max_entries = 0
+    return web, web.create_app()
+
+
+def web_tokens(web, app, db_path, user_ids):
+    """Пользователи веб-приложения с теми же id, что и в eggs, и их токены"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (id, username, password) VALUES (?, ?, '')",
+        [(uid, f'bench-{uid}') for uid in user_ids]
+    )
+    conn.commit()
+    conn.close()
+    with app.app_context():
+        return {
+            uid: web.create_access_token(identity={'id': uid, 'username': f'bench-{uid}'},
+                                         additional_claims={'tv': 0})
+            for uid in user_ids
+        }
+
+
+def run_web(args):
+    web, app = load_web_app(args.db, args.response_cache)
+    conn = sqlite3.connect(args.db)
+    user_ids = sample_user_ids(conn, args.users)
+    conn.close()
+    tokens = web_tokens(web, app, args.db, user_ids)
+
+    month_ago = web.storage.period_start(30)
+    endpoints = [name for name in WEB_ENDPOINTS if not args.endpoints or name in args.endpoints]
+    # План запросов фиксирован seed, поэтому прогоны разных коммитов сравнимы
+    rnd = random.Random(args.seed)
+    plan = [(rnd.choice(endpoints), rnd.choice(user_ids)) for _ in range(args.requests)]
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    local = threading.local()
+
+    def send(item):
+        name, uid = item
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        url = WEB_ENDPOINTS[name].format(month_ago=month_ago)
+        started = time.perf_counter()
+        response = client.get(url, headers={'Authorization': f'Bearer {tokens[uid]}'})
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies[name].append(elapsed)
+            if response.status_code not in (200, 404):
+                errors[name] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(send, plan))
+    wall = time.perf_counter() - started
+
+    results = [
+        {'name': f'GET {name}', 'group': 'web', 'errors': errors[name], 'stats': summarize(samples)}
+        for name, samples in sorted(latencies.items())
+    ]
+    results.append({'name': 'throughput', 'group': 'web',
+                    'requests': len(plan), 'wall_seconds': wall, 'rps': len(plan) / wall})
+    print_results(results[:-1])
+    print(f'{len(plan)} запросов за {wall:.1f} с: {len(plan) / wall:.1f} запр/с, '
+          f'ошибок: {sum(errors.values())}')
+    return results, {'requests': args.requests, 'concurrency': args.concurrency,
+                     'users': len(user_ids), 'response_cache': args.response_cache}
+
+# ==================== BOT ====================
+
+class FakeMessage:
+    """Сообщение Telegram: ответы копятся в списке вместо отправки"""
+
+    def __init__(self, user_id, text=''):
+        self.from_user = SimpleNamespace(id=user_id, username=f'bench{user_id}', first_name='Bench')
+        self.chat = SimpleNamespace(id=user_id, type='private')
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    async def reply_photo(self, photo, **kwargs):
+        self.replies.append(photo.read() if hasattr(photo, 'read') else photo)
+
+    async def reply_document(self, document, **kwargs):
+        if hasattr(document, 'read'):
+            document.read()
+            document.close()
+        self.replies.append(document)
+
+
+def fake_update(user_id, text=''):
+    message = FakeMessage(user_id, text)
+    return SimpleNamespace(message=message, effective_user=message.from_user,
+                           effective_chat=message.chat), message
+
+
+def load_bot(db_path):
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'load-test')
+    use_source_tree('chicken_bot')
+    bot = importlib.import_module('chicken_bot')
+    bot.DB_NAME = db_path
+    bot.init_db()
+    return bot
+
+
+def enable_reminders(db_path, user_ids, share):
+    """Включить напоминания части пользователей; половине - на текущую минуту"""
+    now = time.gmtime(time.time() + 3 * 3600)
+    due = f'{now.tm_hour:02d}:{now.tm_min:02d}'
+    rows = [(uid, 1, due if i % 2 else '20:00', '+03:00')
+            for i, uid in enumerate(user_ids[:int(len(user_ids) * share)])]
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT OR REPLACE INTO user_settings VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def run_bot(args):
+    bot = load_bot(args.db)
+    conn = sqlite3.connect(args.db)
+    user_ids = sample_user_ids(conn, args.users)
+    all_user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM eggs')]
+    conn.close()
+
+    year_ago = bot.storage.period_start(365)
+    today = bot.storage.period_start(1)
+    handlers = {
+        'stats': (bot.show_stats, ['30']),
+        'graph': (bot.show_graph, ['30']),
+        'analytics': (bot.show_analytics, ['30']),
+        'export': (bot.export_data, [year_ago, today]),
+    }
+
+    results = []
+    loop = asyncio.new_event_loop()
+    workdir = os.getcwd()
+    # export_to_excel пишет файл в текущий каталог
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for name, (handler, handler_args) in handlers.items():
+                if args.handlers and name not in args.handlers:
+                    continue
+                samples, errors = [], 0
+                for i in range(args.iterations):
+                    update, message = fake_update(user_ids[i % len(user_ids)])
+                    context = SimpleNamespace(args=list(handler_args), bot=None, user_data={})
+                    started = time.perf_counter()
+                    loop.run_until_complete(handler(update, context))
+                    samples.append(time.perf_counter() - started)
+                    errors += sum(1 for r in message.replies if isinstance(r, str) and r.startswith('❌ Ошибка'))
+                results.append({'name': f'/{name}', 'group': 'bot', 'errors': errors,
+                                'stats': summarize(samples)})
+        finally:
+            os.chdir(workdir)
+            loop.close()
+
+    if not args.handlers or 'reminders' in args.handlers:
+        enabled = enable_reminders(args.db, all_user_ids, args.reminder_share)
+        sent = []
+        bot.send_reminder = sent.append
+        samples = []
+        for _ in range(max(3, args.iterations // 10)):
+            started = time.perf_counter()
+            bot.check_and_remind()
+            samples.append(time.perf_counter() - started)
+        results.append({'name': 'check_and_remind', 'group': 'bot', 'users_enabled': enabled,
+                        'stats': summarize(samples)})
+
+    print_results(results)
+    return results, {'iterations': args.iterations, 'users': len(user_ids),
+                     'reminder_share': args.reminder_share}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('target', choices=['web', 'bot'])
+    parser.add_argument('--db', default=DEFAULT_DB, help='база от generate_data.py (будет изменена)')
+    parser.add_argument('--users', type=int, default=100, help='сколько пользователей в выборке')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='файл для результатов')
+    web = parser.add_argument_group('web')
+    web.add_argument('--requests', type=int, default=1000)
+    web.add_argument('--concurrency', type=int, default=8)
+    web.add_argument('--endpoints', nargs='*', choices=sorted(WEB_ENDPOINTS))
+    web.add_argument('--no-response-cache', dest='response_cache', action='store_false',
+                     help='отключить кэш ответов, чтобы мерить запросы к БД')
+    bot = parser.add_argument_group('bot')
+    bot.add_argument('--iterations', type=int, default=30, help='вызовов каждого обработчика')
+    bot.add_argument('--handlers', nargs='*', choices=['stats', 'graph', 'analytics', 'export', 'reminders'])
+    bot.add_argument('--reminder-share', type=float, default=0.3, help='доля пользователей с напоминаниями')
+    args = parser.parse_args()
+
+    results, params = run_web(args) if args.target == 'web' else run_bot(args)
+    if args.json:
+        write_results(args.json, results, dict(params, db=args.db, target=args.target))
+
+
+if __name__ == '__main__':
+    main()
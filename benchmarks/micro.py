@@ -0,0 +1,88 @@
+"""Микробенчмарки функций tenhens_core на сгенерированной базе.
+
+    python benchmarks/generate_data.py --users 10000 --years 5
+    python benchmarks/micro.py --rounds 50 --json benchmarks/results/micro.json
+
+Каждый бенчмарк по кругу вызывается для выборки пользователей, поэтому
+замер отражает разброс объёма истории. Если зависимость (numpy, scipy,
+matplotlib) не установлена, бенчмарк помечается пропущенным.
+"""
+import argparse
+import sqlite3
+
+from harness import DEFAULT_DB, bench, print_results, sample_user_ids, use_source_tree, write_results
+
+use_source_tree()
+from tenhens_core import analytics, rendering, security, storage
+
+
+def engine_benchmarks(conn):
+    """(имя, группа, функция от user_id)"""
+    today = storage.period_start(1)
+    month_ago = storage.period_start(30)
+    cases = [
+        ('query_records[all]', 'storage', lambda uid: storage.query_records(conn, uid)),
+        ('query_records[30d]', 'storage', lambda uid: storage.query_records(conn, uid, month_ago, today)),
+        ('query_records[notes]', 'storage', lambda uid: storage.query_records(conn, uid, search_notes='корм')),
+        ('query_summary', 'storage', lambda uid: storage.query_summary(conn, uid)),
+        ('query_plot_points[30d]', 'storage', lambda uid: storage.query_plot_points(conn, uid, 30)),
+        ('get_data_version', 'storage', lambda uid: storage.get_data_version(conn, uid)),
+    ]
+    for days in (7, 30, 365):
+        cases.append((f'query_daily_totals[{days}d]', 'storage',
+                      lambda uid, days=days: storage.query_daily_totals(conn, uid, days)))
+    for days in (365, 1825):
+        resolution = storage.pick_resolution(days)
+        cases.append((f'query_series[{days}d,{resolution}]', 'storage',
+                      lambda uid, days=days, resolution=resolution: storage.query_series(conn, uid, days, resolution)))
+    for days in (7, 30, 365):
+        cases.append((f'query_analytics[{days}d]', 'analytics',
+                      lambda uid, days=days: analytics.query_analytics(conn, uid, days)))
+    for days in (30, 1825):
+        cases.append((f'query_chart+render_chart[{days}d]', 'rendering',
+                      lambda uid, days=days: rendering.render_chart(rendering.query_chart(conn, uid, days), days)))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=DEFAULT_DB, help='база от generate_data.py')
+    parser.add_argument('--users', type=int, default=50, help='сколько пользователей в выборке')
+    parser.add_argument('--rounds', type=int, default=30, help='замеров на бенчмарк')
+    parser.add_argument('-k', dest='keyword', default='', help='запускать только бенчмарки с подстрокой в имени')
+    parser.add_argument('--json', help='файл для результатов')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    user_ids = [(uid,) for uid in sample_user_ids(conn, args.users)]
+
+    results = []
+    for name, group, func in engine_benchmarks(conn):
+        if args.keyword not in name:
+            continue
+        result = {'name': name, 'group': group}
+        try:
+            result['stats'] = bench(func, user_ids, args.rounds)
+        except ImportError as e:
+            result['skipped'] = str(e)
+        results.append(result)
+
+    # Хэширование не зависит от данных и дорогое: замеряется реже
+    stored = security.hash_password('benchmark-password')
+    hash_rounds = max(3, args.rounds // 5)
+    for name, func, call_args in (
+        ('hash_password', security.hash_password, ('benchmark-password',)),
+        ('verify_password', security.verify_password, ('benchmark-password', stored)),
+    ):
+        if args.keyword in name:
+            results.append({'name': name, 'group': 'security',
+                            'stats': bench(func, [call_args], hash_rounds, warmup=1)})
+    conn.close()
+
+    print_results(results)
+    if args.json:
+        write_results(args.json, results, {'db': args.db, 'users': len(user_ids), 'rounds': args.rounds})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Проверка планов всех SQL-запросов приложений на заполненной базе.
+
+    python benchmarks/generate_data.py --users 2000 --years 2
+    python benchmarks/query_plans.py --targets core web bot
+
+Запросы собираются из реестра tenhens_core.storage.statements: скрипт
+вызывает функции ядра со всеми сочетаниями фильтров, эндпоинты веб-приложения
+и обработчики бота (если их зависимости установлены), затем выполняет
+EXPLAIN QUERY PLAN для каждого запомненного запроса. Завершается с ошибкой,
+если какой-либо запрос читает eggs полным проходом (SCAN eggs).
+"""
+import argparse
+import re
+import sqlite3
+import sys
+
+from harness import DEFAULT_DB, sample_user_ids, use_source_tree
+
+use_source_tree()
+from tenhens_core import analytics, anomalies, forecast, rendering, storage
+
+# Таблицы, полный проход которых считается ошибкой
+CHECKED_TABLES = ('eggs',)
+
+# Запросы, которым полный проход нужен по смыслу (отпечатки storage.fingerprint)
+ALLOWED_SCANS = set()
+
+PLANNED = re.compile(r'^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+# ==================== EXERCISE ====================
+
+def exercise_core(db_path, user_id):
+    conn = storage.connect(db_path)
+    today = storage.period_start(1)
+    month_ago = storage.period_start(30)
+    for min_date, max_date in ((None, None), (month_ago, None), (None, today), (month_ago, today)):
+        storage.query_records(conn, user_id, min_date, max_date)
+    storage.query_summary(conn, user_id)
+    storage.query_plot_points(conn, user_id, 30)
+    for days in (30, 365, 1825):
+        storage.query_series(conn, user_id, days, storage.pick_resolution(days))
+    for func in (analytics.query_analytics, rendering.query_chart, forecast.query_forecast):
+        try:
+            func(conn, user_id, 30)
+        except ImportError:
+            pass
+    # Запись, изменение и удаление в транзакции, которая откатывается
+    record_id = storage.add_record(conn, user_id, today, 1, 'query plans')
+    storage.get_record(conn, record_id, user_id)
+    storage.update_record(conn, record_id, user_id, count=2, date=today, notes='')
+    storage.delete_record(conn, record_id, user_id)
+    storage.get_data_version(conn, user_id)
+    storage.query_global_stats(conn)
+    anomalies.query_pending_alerts(conn, today)
+    for order in storage.USER_ACTIVITY_ORDERS:
+        storage.query_user_activity_page(conn, order)
+        storage.query_user_activity_page(conn, order, (1, user_id))
+        storage.query_user_activity_page(conn, order, (1, user_id), backward=True)
+    conn.rollback()
+    conn.close()
+
+
+def exercise_web(db_path, user_id):
+    from load_test import WEB_ENDPOINTS, load_web_app, web_tokens
+
+    web, app = load_web_app(db_path, response_cache=False)
+    token = web_tokens(web, app, db_path, [user_id])[user_id]
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    month_ago = storage.period_start(30)
+    urls = [url.format(month_ago=month_ago) for url in WEB_ENDPOINTS.values()]
+    urls.append(f'/api/records?min_date={month_ago}&max_date={storage.period_start(1)}')
+    urls.append(f'/api/records?max_date={month_ago}&search_notes=корм')
+    for url in urls:
+        client.get(url, headers=headers)
+
+
+def exercise_bot(db_path, user_id):
+    import asyncio
+    import os
+    import tempfile
+    from types import SimpleNamespace
+
+    from load_test import fake_update, load_bot
+
+    bot = load_bot(db_path)
+    bot.ADMIN_IDS = [user_id]
+    bot.send_reminder = lambda uid: None
+    handlers = [
+        (bot.show_stats, ['30']),
+        (bot.show_graph, ['30']),
+        (bot.show_analytics, ['30']),
+        (bot.show_forecast, ['14']),
+        (bot.export_data, [storage.period_start(365), storage.period_start(1)]),
+        (bot.show_general_stats, []),
+        (bot.list_users, []),
+    ]
+    loop = asyncio.new_event_loop()
+    workdir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for handler, handler_args in handlers:
+                update, _ = fake_update(user_id)
+                context = SimpleNamespace(args=list(handler_args), bot=None, user_data={})
+                loop.run_until_complete(handler(update, context))
+        finally:
+            os.chdir(workdir)
+            loop.close()
+    bot.get_user_settings(user_id)
+    bot.check_and_remind()
+
+
+TARGETS = {'core': exercise_core, 'web': exercise_web, 'bot': exercise_bot}
+
+# ==================== PLANS ====================
+
+def explain(conn, sql, parameters):
+    if parameters is None:
+        parameters = (None,) * sql.count('?')
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)]
+
+
+def full_scans(plan):
+    tables = '|'.join(CHECKED_TABLES)
+    return [step for step in plan if re.match(rf'SCAN (TABLE )?({tables})\b', step)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=DEFAULT_DB, help='база от generate_data.py (будет изменена)')
+    parser.add_argument('--targets', nargs='*', default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument('-v', '--verbose', action='store_true', help='печатать планы всех запросов')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    storage.init_schema(conn)
+    conn.commit()
+    user_id = sample_user_ids(conn, 1)[0]
+
+    for target in args.targets:
+        try:
+            TARGETS[target](args.db, user_id)
+        except ImportError as e:
+            print(f'{target}: пропущено, нет зависимости ({e})')
+
+    failures = []
+    for statement, (sql, parameters) in sorted(storage.statements.items()):
+        if not PLANNED.match(sql):
+            continue
+        plan = explain(conn, sql, parameters)
+        scans = full_scans(plan)
+        if scans and statement not in ALLOWED_SCANS:
+            failures.append(statement)
+            mark = 'ПОЛНЫЙ ПРОХОД'
+        else:
+            mark = 'ok' if not scans else 'ok (разрешён)'
+        if args.verbose or mark != 'ok':
+            print(f'[{mark}] {statement}')
+            for step in plan:
+                print(f'    {step}')
+    conn.close()
+
+    print(f'Проверено запросов: {sum(1 for sql, _ in storage.statements.values() if PLANNED.match(sql))}, '
+          f'с полным проходом: {len(failures)}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,33 @@
 import os
-import sqlite3
 import threading
 import time
 import asyncio
+import bisect
 import re
+from collections import OrderedDict
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import numpy as np
-from scipy import stats
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.chart import LineChart, Reference
+from functools import wraps
 from dotenv import load_dotenv
 from telegram import Bot, Update, ReplyKeyboardMarkup
+from telegram.error import BadRequest, Forbidden
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
+from apscheduler.events import EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.background import BackgroundScheduler
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ConversationHandler
 
+from tenhens_core import anomalies, metrics, profiling, storage
+from tenhens_core.analytics import compute_analytics, query_analytics
+from tenhens_core.forecast import MAX_HORIZON_DAYS, query_forecast
+from tenhens_core.rendering import query_chart, render_chart
 
 # Настройки
 ADMIN_IDS = [int(id_str.strip()) for id_str in os.getenv("ADMIN_IDS", "").split(",") if id_str.strip()]
@@ -40,28 +43,155 @@ DB_NAME = "/app/data/egg_database.db"  # Для Docker
 # DB_NAME = "egg_database.db"  # Для локального использования
 
 
+# Порт для /metrics; 0 отключает
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9101))
+
+handler_seconds = metrics.registry.histogram(
+    'tenhens_bot_handler_seconds', 'Время обработки обновления Telegram', ('handler',))
+handler_errors = metrics.registry.counter(
+    'tenhens_bot_handler_errors_total', 'Необработанные исключения в обработчиках', ('handler',))
+scheduler_lag = metrics.registry.histogram(
+    'tenhens_scheduler_lag_seconds', 'Задержка запуска задачи относительно расписания', ('job',))
+scheduler_job_seconds = metrics.registry.histogram(
+    'tenhens_scheduler_job_seconds', 'Время выполнения задачи планировщика', ('job',))
+
+def instrumented(callback):
+    """Обёртка обработчика: время выполнения и исключения попадают в метрики"""
+    name = callback.__name__
+
+    @wraps(callback)
+    async def wrapper(update, context):
+        with metrics.timer(handler_seconds, handler=name):
+            try:
+                return await callback(update, context)
+            except Exception as e:
+                handler_errors.inc(handler=name)
+                print(f"Ошибка в обработчике {name}: {str(e)}")
+                raise
+    return wrapper
+
+def instrument_handlers(handlers):
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            instrument_handlers(handler.entry_points)
+            instrument_handlers(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                instrument_handlers(state_handlers)
+        else:
+            handler.callback = instrumented(handler.callback)
+
+# ==================== BOT USERS ====================
+
+# last_seen пишется не чаще раза в час на пользователя, а не на каждое сообщение
+BOT_USER_TOUCH_SECONDS = 3600
+bot_users_touched = {}
+
+def remember_bot_user(user_id, username=None):
+    """Добавить пользователя в получатели рассылок или обновить last_seen"""
+    now = time.monotonic()
+    if now - bot_users_touched.get(user_id, -BOT_USER_TOUCH_SECONDS) < BOT_USER_TOUCH_SECONDS:
+        return
+    bot_users_touched[user_id] = now
+
+    seen = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = storage.connect(DB_NAME)
+    # Пользователь снова пишет боту - значит, он его не блокирует
+    conn.execute(
+        '''INSERT INTO bot_users (user_id, username, first_seen, last_seen) VALUES (?, ?, ?, ?)
+           ON CONFLICT(user_id) DO UPDATE SET username = excluded.username,
+                                              last_seen = excluded.last_seen,
+                                              blocked = 0''',
+        (user_id, username, seen, seen)
+    )
+    conn.commit()
+    conn.close()
+
+async def track_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Группа -1: выполняется перед остальными обработчиками любого обновления
+    user = update.effective_user
+    if user is not None:
+        remember_bot_user(user.id, user.username)
+
+def get_broadcast_audience():
+    conn = storage.connect(DB_NAME)
+    user_ids = [row[0] for row in conn.execute("SELECT user_id FROM bot_users WHERE blocked = 0")]
+    conn.close()
+    return user_ids
+
+def mark_blocked(user_ids):
+    if not user_ids:
+        return
+    conn = storage.connect(DB_NAME)
+    conn.executemany("UPDATE bot_users SET blocked = 1 WHERE user_id = ?", [(uid,) for uid in user_ids])
+    conn.commit()
+    conn.close()
+    # Следующее сообщение от пользователя должно сразу снять blocked, не дожидаясь часа
+    for uid in user_ids:
+        bot_users_touched.pop(uid, None)
+
+async def send_broadcast(bot, message):
+    """Разослать сообщение всем незаблокированным; возвращает (успешно, не удалось)"""
+    success = 0
+    failed = 0
+    blocked = []
+
+    for uid in get_broadcast_audience():
+        try:
+            await bot.send_message(
+                chat_id=uid,
+                text=f"📢 Сообщение от администратора:\n\n{message}"
+            )
+            success += 1
+        except Forbidden:
+            # Бот заблокирован или удалён из чата: следующие рассылки его пропустят
+            blocked.append(uid)
+            failed += 1
+        except BadRequest as e:
+            if 'chat not found' in str(e).lower():
+                blocked.append(uid)
+            failed += 1
+        except Exception:
+            failed += 1
+
+    mark_blocked(blocked)
+    return success, failed
+
 # Константа для состояния рассылки
 BROADCAST_MESSAGE = 1
 
 # Инициализация базы данных
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
+    conn = storage.connect(DB_NAME)
+    # Записи о яйценоскости и версии данных - общие для всех приложений
+    storage.init_schema(conn)
     c = conn.cursor()
 
-    # Таблица для записей о яйценоскости
-    c.execute('''CREATE TABLE IF NOT EXISTS eggs
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                date TEXT,
-                count INTEGER,
-                notes TEXT)''')
-
     # Таблица для настроек пользователей
     c.execute('''CREATE TABLE IF NOT EXISTS user_settings
                 (user_id INTEGER PRIMARY KEY,
                 reminders_enabled BOOLEAN DEFAULT 0,
                 reminder_time TEXT DEFAULT '20:00',
                 timezone TEXT DEFAULT '+03:00')''')
+    # Время сравнивается строкой с strftime('%H:%M'): '9:00' из старых версий -> '09:00'
+    c.execute("UPDATE user_settings SET reminder_time = '0' || reminder_time WHERE reminder_time GLOB '[0-9]:[0-9][0-9]'")
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_user_settings_reminders
+                 ON user_settings (user_id, reminder_time, timezone) WHERE reminders_enabled = 1''')
+
+    # Все, кто писал боту: получатели рассылок. blocked - бот заблокирован или чат недоступен
+    c.execute('''CREATE TABLE IF NOT EXISTS bot_users
+                (user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                blocked INTEGER NOT NULL DEFAULT 0)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bot_users_blocked ON bot_users (blocked)")
+    # Пользователи, писавшие до появления таблицы: авторы записей и настроек напоминаний
+    if c.execute("SELECT 1 FROM bot_users LIMIT 1").fetchone() is None:
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.execute('''INSERT OR IGNORE INTO bot_users (user_id, first_seen, last_seen)
+                     SELECT user_id, ?, ? FROM user_activity
+                     UNION SELECT user_id, ?, ? FROM user_settings''', (now, now, now, now))
 
     conn.commit()
     conn.close()
@@ -73,47 +203,161 @@ def is_valid_date(date_str):
     except ValueError:
         return False
 
+# ==================== HOT CACHE ====================
+
+# Настройки и последние записи активных пользователей в памяти процесса.
+# Записи из бота применяются к кэшу сразу; записи из веб-приложения и Streamlit
+# замечаются по версии данных пользователя (одно чтение по первичному ключу).
+HOT_CACHE_USERS = int(os.getenv("HOT_CACHE_USERS", 1000))
+# Сколько последних записей держать: при записи раз в день - около трёх месяцев
+HOT_CACHE_RECORDS = int(os.getenv("HOT_CACHE_RECORDS", 180))
+
+class HotRecords:
+    """Последние записи пользователя (date, id, count, notes) по возрастанию даты.
+
+    Все записи, которых нет в буфере, не новее самой старой записи в нём;
+    complete - в буфере вся история пользователя.
+    """
+
+    def __init__(self, records, version, complete):
+        self.records = records
+        self.version = version
+        self.complete = complete
+
+    def covers_since(self, start_date):
+        """Есть ли в буфере все записи с датой не раньше start_date"""
+        return self.complete or (bool(self.records) and self.records[0][0] < start_date)
+
+    def covers_last(self, n):
+        """Есть ли в буфере n последних записей (или вся история)"""
+        return self.complete or len(self.records) >= n
+
+    def insert(self, record):
+        if not self.complete and self.records and record < self.records[0]:
+            # Старше буфера: за его пределами запись и так учтена бы не была
+            return
+        bisect.insort(self.records, record)
+        if len(self.records) > HOT_CACHE_RECORDS:
+            del self.records[0]
+            self.complete = False
+
+    def remove(self, record_id):
+        for i, record in enumerate(self.records):
+            if record[1] == record_id:
+                del self.records[i]
+                return record
+        return None
+
+hot_requests = metrics.registry.counter(
+    'tenhens_bot_hot_cache_total', 'Ответы из кэша последних записей и запросы к БД', ('kind', 'result'))
+
+hot_users = OrderedDict()
+hot_users_lock = threading.Lock()
+
+def hot_entry(user_id):
+    """Словарь кэша пользователя: settings и records, последний использованный - в конце"""
+    with hot_users_lock:
+        entry = hot_users.get(user_id)
+        if entry is None:
+            entry = hot_users[user_id] = {'settings': None, 'records': None}
+            while len(hot_users) > HOT_CACHE_USERS:
+                hot_users.popitem(last=False)
+        else:
+            hot_users.move_to_end(user_id)
+        return entry
+
+def get_hot_records(conn, user_id):
+    """Буфер последних записей, перечитанный, если данные менялись вне бота"""
+    entry = hot_entry(user_id)
+    version = storage.get_data_version(conn, user_id)
+    hot = entry['records']
+    if hot is not None and hot.version == version:
+        return hot
+
+    rows = conn.execute(
+        '''SELECT date, id, count, notes FROM eggs
+           WHERE user_id = ?
+           ORDER BY date DESC, id DESC
+           LIMIT ?''',
+        (user_id, HOT_CACHE_RECORDS + 1)
+    ).fetchall()
+    complete = len(rows) <= HOT_CACHE_RECORDS
+    hot = entry['records'] = HotRecords([tuple(row) for row in reversed(rows[:HOT_CACHE_RECORDS])],
+                                        version, complete)
+    return hot
+
+def hot_plot_points(hot, days):
+    """Точки графика как в storage.query_plot_points или None, если буфера не хватает"""
+    start_date = storage.period_start(days)
+    if not hot.covers_since(start_date):
+        return None
+    totals = {}
+    for date, _, count, _ in hot.records:
+        if date >= start_date:
+            totals[date] = totals.get(date, 0) + count
+    if totals:
+        return list(totals), list(totals.values())
+
+    # За период пусто - последние записи, как в query_plot_points
+    if not hot.covers_last(days):
+        return None
+    recent = hot.records[-days:] if days > 0 else []
+    return [row[0] for row in recent], [row[2] for row in recent]
+
+def write_through(user_id, version, removed_id=None, added=None):
+    """Применить запись бота к буферу; version - версия данных после неё"""
+    with hot_users_lock:
+        entry = hot_users.get(user_id)
+    hot = entry and entry['records']
+    if hot is None:
+        return
+    if hot.version != version - 1:
+        # Между чтением и записью данные менял кто-то ещё: буфер перечитается
+        entry['records'] = None
+        return
+    if removed_id is not None:
+        hot.remove(removed_id)
+    if added is not None:
+        hot.insert(added)
+    hot.version = version
+
 # Добавление записи
 def add_egg_record(user_id, date, count, notes=""):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, ?, ?)",
-              (user_id, date, count, notes))
-    record_id = c.lastrowid
+    conn = storage.connect(DB_NAME)
+    record_id = storage.add_record(conn, user_id, date, count, notes)
+    version = storage.get_data_version(conn, user_id)
     conn.commit()
     conn.close()
+    write_through(user_id, version, added=(date, record_id, count, notes))
     return record_id
 
-def get_record_by_id(record_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM eggs WHERE id=?", (record_id,))
-    record = c.fetchone()
+def add_egg_records(user_id, records):
+    """Добавить записи (date, count, notes) одной транзакцией"""
+    conn = storage.connect(DB_NAME)
+    added = storage.add_records(conn, user_id, records)
+    conn.commit()
     conn.close()
-    return record
-
-def update_record(record_id, count=None, date=None, notes=None):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    updates = []
-    params = []
-
-    if count is not None:
-        updates.append("count = ?")
-        params.append(count)
-    if date is not None:
-        updates.append("date = ?")
-        params.append(date)
-    if notes is not None:
-        updates.append("notes = ?")
-        params.append(notes)
-
-    if updates:
-        query = f"UPDATE eggs SET {', '.join(updates)} WHERE id = ?"
-        params.append(record_id)
-        c.execute(query, params)
-        conn.commit()
+    # id новых записей не известны: буфер перечитается при следующем запросе
+    with hot_users_lock:
+        entry = hot_users.get(user_id)
+    if entry is not None:
+        entry['records'] = None
+    return added
+
+def update_record(record_id, user_id, count=None, date=None, notes=None):
+    """Обновить запись пользователя, возвращает False, если записи нет или она чужая"""
+    conn = storage.connect(DB_NAME)
+    old = storage.get_record(conn, record_id, user_id)
+    found = old is not None and storage.update_record(conn, record_id, user_id, count, date, notes)
+    version = storage.get_data_version(conn, user_id)
+    conn.commit()
     conn.close()
+    if found:
+        _, _, old_date, old_count, old_notes = old
+        updated = (old_date if date is None else date, record_id,
+                   old_count if count is None else count, old_notes if notes is None else notes)
+        write_through(user_id, version, removed_id=record_id, added=updated)
+    return found
 
 async def edit_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -132,24 +376,26 @@ async def edit_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
         new_date = args[2] if len(args) > 2 and is_valid_date(args[2]) else None
         new_notes = " ".join(args[3:]) if len(args) > 3 else None
 
-        # Проверка, что запись принадлежит пользователю
-        record = get_record_by_id(record_id)
-        if not record or record[1] != user_id:
+        # Запись обновляется, только если принадлежит пользователю
+        if not update_record(record_id, user_id, new_count, new_date, new_notes):
             await update.message.reply_text("❌ Запись не найдена или недоступна.")
             return
 
-        update_record(record_id, new_count, new_date, new_notes)
         await update.message.reply_text("✅ Запись успешно обновлена!")
 
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
 
-def delete_record(record_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM eggs WHERE id=?", (record_id,))
+def delete_record(record_id, user_id):
+    """Удалить запись пользователя, возвращает False, если записи нет или она чужая"""
+    conn = storage.connect(DB_NAME)
+    found = storage.delete_record(conn, record_id, user_id)
+    version = storage.get_data_version(conn, user_id)
     conn.commit()
     conn.close()
+    if found:
+        write_through(user_id, version, removed_id=record_id)
+    return found
 
 async def delete_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -162,13 +408,11 @@ async def delete_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         record_id = int(args[0])
 
-        # Проверка, что запись принадлежит пользователю
-        record = get_record_by_id(record_id)
-        if not record or record[1] != user_id:
+        # Запись удаляется, только если принадлежит пользователю
+        if not delete_record(record_id, user_id):
             await update.message.reply_text("❌ Запись не найдена или недоступна.")
             return
 
-        delete_record(record_id)
         await update.message.reply_text("✅ Запись успешно удалена!")
 
     except Exception as e:
@@ -176,17 +420,21 @@ async def delete_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # Получение статистики
 def get_stats(user_id, days=7):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    conn = storage.connect(DB_NAME)
+    start_date = storage.period_start(days)
+    hot = get_hot_records(conn, user_id)
 
-    # Запрос для получения данных
-    query = '''SELECT id, date, count
-               FROM eggs
-               WHERE user_id = ? AND date >= ?
-               ORDER BY date'''
-    c.execute(query, (user_id, start_date))
-    data = c.fetchall()
+    if hot.covers_since(start_date):
+        hot_requests.inc(kind='stats', result='hit')
+        data = [(record_id, date, count) for date, record_id, count, _ in hot.records if date >= start_date]
+    else:
+        hot_requests.inc(kind='stats', result='miss')
+        # Запрос для получения данных
+        query = '''SELECT id, date, count
+                   FROM eggs
+                   WHERE user_id = ? AND date >= ?
+                   ORDER BY date, id'''
+        data = conn.execute(query, (user_id, start_date)).fetchall()
     conn.close()
 
     # Группируем данные по дате и суммируем количество яиц
@@ -222,39 +470,23 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     stats_text += f"\nВсего: {total} яиц\nСреднее: {total/len(data):.1f} яиц/день"
     await update.message.reply_text(stats_text)
 
-def has_today_entry(user_id):
-    today = datetime.now().strftime("%Y-%m-%d")
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM eggs WHERE user_id = ? AND date = ?",
-              (user_id, today))
-    count = c.fetchone()[0]
-    conn.close()
-    return count > 0
-
 # Функция для генерации графиков
 def generate_plot(user_id, days=7):
-    data = get_stats(user_id, days)
-    if not data:
+    """PNG с графиком яйценоскости или None, если записей нет"""
+    conn = storage.connect(DB_NAME)
+    points = None
+    if storage.pick_resolution(days) == 'day':
+        points = hot_plot_points(get_hot_records(conn, user_id), days)
+    if points is not None:
+        hot_requests.inc(kind='graph', result='hit')
+        chart = (points[0], points[1], None, 'day') if points[0] else None
+    else:
+        hot_requests.inc(kind='graph', result='miss')
+        chart = query_chart(conn, user_id, days)
+    conn.close()
+    if not chart:
         return None
-
-    # Извлекаем даты и значения
-    dates = [datetime.strptime(row[0], "%Y-%m-%d") for row in data]
-    counts = [row[1] for row in data]
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(dates, counts, marker='o', linestyle='-', color='#ff6b6b')
-    plt.title(f'Ваша яйценоскость за {days} дней')
-    plt.xlabel('Дата')
-    plt.ylabel('Количество яиц')
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    filename = f"egg_stats_{user_id}_{days}days.png"
-    plt.savefig(filename, dpi=100)
-    plt.close()
-    return filename
+    return render_chart(chart, days, title='Ваша яйценоскость')
 
 # Команда для графиков
 async def show_graph(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -264,13 +496,12 @@ async def show_graph(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if days <= 0:
             raise ValueError
 
-        filename = generate_plot(user_id, days)
-        if filename:
+        image = generate_plot(user_id, days)
+        if image:
             await update.message.reply_photo(
-                photo=open(filename, 'rb'),
+                photo=image,
                 caption=f'📈 График яйценоскости за {days} дней'
             )
-            os.remove(filename)
         else:
             await update.message.reply_text("❌ Нет данных для построения графика")
 
@@ -281,51 +512,17 @@ async def show_graph(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # Функция аналитики
 def calculate_analytics(user_id, days=7):
-    # Получаем данные за два периода для сравнения
-    data = get_stats(user_id, days * 2)
-
-    if len(data) < 2:
-        return None
-
-    # Разделяем данные на текущий и предыдущий периоды
-    current = data[-days:]
-    previous = data[:-days]
-
-    # Основные метрики
-    current_counts = [c[1] for c in current]
-    avg_current = np.mean(current_counts)
-    avg_previous = np.mean([p[1] for p in previous]) if previous else 0
-
-    # Статистический анализ (тренд)
-    slope, _, _, _, _ = stats.linregress(
-        range(len(current_counts)), current_counts
-    )
-
-    # Анализ заметок
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''SELECT notes FROM eggs
-                 WHERE user_id = ? AND date >= date('now', ?)''',
-              (user_id, f'-{days} days',))
-    notes = [note[0].lower() for note in c.fetchall() if note[0]]
-
-    word_analysis = {}
-    for note in notes:
-        for word in note.split():
-            word_analysis[word] = word_analysis.get(word, 0) + 1
-    top_words = sorted(word_analysis.items(),
-                      key=lambda x: x[1], reverse=True)[:3]
-
+    conn = storage.connect(DB_NAME)
+    hot = get_hot_records(conn, user_id)
+    # Аналитика сравнивает последние days записей с days предыдущими
+    if hot.covers_last(days * 2):
+        hot_requests.inc(kind='analytics', result='hit')
+        analytics = compute_analytics([(date, count, notes) for date, _, count, notes in hot.records], days)
+    else:
+        hot_requests.inc(kind='analytics', result='miss')
+        analytics = query_analytics(conn, user_id, days)
     conn.close()
-
-    return {
-        'current_avg': avg_current,
-        'previous_avg': avg_previous,
-        'trend': slope * days,  # Общий тренд за период
-        'max_day': max(current, key=lambda x: x[1]),
-        'min_day': min(current, key=lambda x: x[1]),
-        'top_words': top_words
-    }
+    return analytics
 
 async def show_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -364,6 +561,42 @@ async def show_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
 
+# Функция прогноза
+def calculate_forecast(user_id, horizon=7):
+    conn = storage.connect(DB_NAME)
+    forecast = query_forecast(conn, user_id, horizon)
+    # Сохраняем обновлённую модель пользователя
+    conn.commit()
+    conn.close()
+    return forecast
+
+async def show_forecast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        user_id = update.message.from_user.id
+        horizon = int(context.args[0]) if context.args else 7
+        if not 1 <= horizon <= MAX_HORIZON_DAYS:
+            raise ValueError
+
+        forecast = calculate_forecast(user_id, horizon)
+        if not forecast:
+            await update.message.reply_text("❌ Недостаточно данных для прогноза: нужно хотя бы две недели записей")
+            return
+
+        method = 'сглаживание с трендом' if forecast['method'] == 'holt' else 'недельный цикл'
+        response = f"🔮 Прогноз на {horizon} дней ({method}):\n\n"
+        response += "\n".join(
+            f"📅 {point['date']}: ~{point['count']:.0f} яиц ({point['low']:.0f}–{point['high']:.0f})"
+            for point in forecast['points']
+        )
+        total = sum(point['count'] for point in forecast['points'])
+        response += f"\n\nВсего за период: ~{total:.0f} яиц"
+        await update.message.reply_text(response)
+
+    except (ValueError, IndexError):
+        await update.message.reply_text(f"Используйте: /forecast [дни] — от 1 до {MAX_HORIZON_DAYS} (по умолчанию 7)")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+
 # Команды бота
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -379,7 +612,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "▪ /add — добавить запись\n"
         "▪ /stats [дни] — статистика\n"
         "▪ /graph [дни] — график\n"
-        "▪ /analytics [дни] — расширенная аналитика\n\n"
+        "▪ /analytics [дни] — расширенная аналитика\n"
+        "▪ /forecast [дни] — прогноз яйценоскости\n\n"
         "Управление записями:\n"
         "▪ /edit <ID> <количество> [дата] [комментарий] — изменить запись\n"
         "▪ /delete <ID> — удалить запись\n\n"
@@ -405,7 +639,9 @@ async def add_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Примеры:\n"
         "12 — добавить 12 яиц на сегодня\n"
         "12 2023-12-15 — добавить 12 яиц на 15 декабря 2023\n"
-        "12 сегодня Корм поменяли — добавить 12 яиц на сегодня с комментарием"
+        "12 сегодня Корм поменяли — добавить 12 яиц на сегодня с комментарием\n"
+        "12 2024-05-01..2024-05-07 — по 12 яиц на каждый день периода\n\n"
+        "Несколько записей можно отправить одним сообщением, по одной на строку"
     )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -418,6 +654,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "▪ /stats — статистика\n"
             "▪ /graph — график\n"
             "▪ /analytics — аналитика\n"
+            "▪ /forecast — прогноз\n"
             "▪ /edit — изменить запись\n"
             "▪ /delete — удалить запись\n"
             "▪ /export — экспорт\n"
@@ -439,7 +676,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "Примеры:\n"
                 "12 — добавить 12 яиц на сегодня\n"
                 "12 2023-12-15 — добавить 12 яиц на 15 декабря 2023\n"
-                "12 сегодня Корм поменяли — добавить 12 яиц на сегодня с комментарием"
+                "12 сегодня Корм поменяли — добавить 12 яиц на сегодня с комментарием\n"
+                "12 2024-05-01..2024-05-07 — по 12 яиц на каждый день периода\n\n"
+                "Несколько записей можно отправить одним сообщением, по одной на строку:\n"
+                "10 2024-05-01\n"
+                "11 2024-05-02 Дождь"
             )
         elif command == "stats":
             help_text = (
@@ -465,6 +706,16 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "/analytics — аналитика за 7 дней\n"
                 "/analytics 14 — аналитика за 14 дней"
             )
+        elif command == "forecast":
+            help_text = (
+                "🔮 Прогноз:\n"
+                "Используйте команду /forecast [дни], чтобы получить прогноз яйценоскости "
+                f"на указанное количество дней (до {MAX_HORIZON_DAYS}) после последней записи.\n"
+                "Нужно хотя бы две недели записей.\n\n"
+                "Примеры:\n"
+                "/forecast — прогноз на 7 дней\n"
+                "/forecast 30 — прогноз на 30 дней"
+            )
         elif command == "edit":
             help_text = (
                 "✏️ Редактирование записи:\n"
@@ -503,6 +754,64 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text(help_text)
 
+# Пакетный ввод: не больше стольких записей в одном сообщении
+MAX_BATCH_ENTRIES = 366
+
+ENTRY_FORMAT_HELP = (
+    "❌ Ошибка формата! Примеры:\n"
+    "12 — добавить 12 яиц на сегодня\n"
+    "12 2023-12-15 — добавить 12 яиц на 15 декабря 2023\n"
+    "12 сегодня Корм поменяли — добавить 12 яиц на сегодня с комментарием\n"
+    "12 2024-05-01..2024-05-07 — по 12 яиц на каждый день периода\n"
+    "Несколько записей можно отправить одним сообщением, по одной на строку"
+)
+
+def parse_entry_dates(value):
+    """Даты из 'сегодня', ГГГГ-ММ-ДД или периода ГГГГ-ММ-ДД..ГГГГ-ММ-ДД"""
+    if value.lower() == "сегодня":
+        return [datetime.now().strftime("%Y-%m-%d")]
+    if '..' not in value:
+        if not is_valid_date(value):
+            raise ValueError("неверный формат даты, используйте ГГГГ-ММ-ДД")
+        return [value]
+
+    start, end = value.split('..', 1)
+    if not (is_valid_date(start) and is_valid_date(end)):
+        raise ValueError("неверный период, используйте ГГГГ-ММ-ДД..ГГГГ-ММ-ДД")
+    start, end = datetime.strptime(start, "%Y-%m-%d"), datetime.strptime(end, "%Y-%m-%d")
+    if start > end:
+        raise ValueError("начало периода позже конца")
+    days = (end - start).days + 1
+    if days > MAX_BATCH_ENTRIES:
+        raise ValueError(f"период длиннее {MAX_BATCH_ENTRIES} дней")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
+def parse_entries(text):
+    """Записи (date, count, notes) из сообщения: по одной строке '<количество> [дата|период] [комментарий]'.
+
+    Проверяется всё сообщение целиком; при ошибке - ValueError с номером строки.
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    numbered = [(number, line) for number, line in enumerate(lines, 1) if line]
+    entries = []
+    for number, line in numbered:
+        try:
+            parts = line.split(maxsplit=2)
+            try:
+                count = int(parts[0])  # Количество яиц
+            except ValueError:
+                raise ValueError("количество должно быть числом")
+            dates = parse_entry_dates(parts[1]) if len(parts) > 1 else parse_entry_dates("сегодня")
+        except ValueError as e:
+            raise ValueError(f"Строка {number}: {e}" if len(numbered) > 1 else str(e))
+        notes = parts[2] if len(parts) > 2 else ""
+        entries.extend((date, count, notes) for date in dates)
+        if len(entries) > MAX_BATCH_ENTRIES:
+            raise ValueError(f"не больше {MAX_BATCH_ENTRIES} записей в одном сообщении")
+    if not entries:
+        raise ValueError("нет данных")
+    return entries
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Если ожидается сообщение для рассылки - пропускаем обычную обработку
@@ -521,41 +830,47 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if text.startswith('/'):
             return
 
-        parts = text.split(maxsplit=2)
-        count = int(parts[0])  # Количество яиц
+        try:
+            entries = parse_entries(text)
+        except ValueError as e:
+            await update.message.reply_text(f"{ENTRY_FORMAT_HELP}\n\n⚠️ {e}")
+            return
 
-        # Обработка даты
-        if len(parts) > 1 and parts[1].lower() != "сегодня":
-            if not is_valid_date(parts[1]):
-                await update.message.reply_text("❌ Неверный формат даты! Используйте ГГГГ-ММ-ДД.")
-                return
-            date = parts[1]
-            notes = parts[2] if len(parts) > 2 else ""
-        else:
-            date = datetime.now().strftime("%Y-%m-%d")
-            notes = parts[2] if len(parts) > 2 else ""
+        if len(entries) == 1:
+            date, count, notes = entries[0]
+            record_id = add_egg_record(user_id, date, count, notes)
+            await update.message.reply_text(
+                f"✅ Добавлено: {count} яиц\n"
+                f"Дата: {date}\n"
+                f"Заметка: {notes}\n"
+                f"ID записи: {record_id}"
+            )
+            return
 
-        # Добавление записи
-        record_id = add_egg_record(user_id, date, count, notes)
+        # Все записи сообщения - одна транзакция и один ответ
+        add_egg_records(user_id, entries)
+        dates = sorted(date for date, _, _ in entries)
+        lines = [f"📅 {date}: {count} яиц" + (f" ({notes})" if notes else "") for date, count, notes in entries[:10]]
+        if len(entries) > 10:
+            lines.append(f"… и ещё {len(entries) - 10}")
         await update.message.reply_text(
-            f"✅ Добавлено: {count} яиц\n"
-            f"Дата: {date}\n"
-            f"Заметка: {notes}\n"
-            f"ID записи: {record_id}"
+            f"✅ Добавлено записей: {len(entries)}, всего {sum(count for _, count, _ in entries)} яиц\n"
+            f"Даты: {dates[0]} — {dates[-1]}\n\n" + "\n".join(lines) +
+            "\n\nID записей можно посмотреть в /stats"
         )
 
     except Exception as e:
-        await update.message.reply_text(
-            "❌ Ошибка формата! Примеры:\n"
-            "12 — добавить 12 яиц на сегодня\n"
-            "12 2023-12-15 — добавить 12 яиц на 15 декабря 2023\n"
-            "12 сегодня Корм поменяли — добавить 12 яиц на сегодня с комментарием"
-        )
+        await update.message.reply_text(ENTRY_FORMAT_HELP)
 
 # Выгрузка в Excel
 def export_to_excel(user_id, start_date=None, end_date=None):
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+    from openpyxl.chart import LineChart, Reference
+
     # Получаем данные из базы
-    conn = sqlite3.connect(DB_NAME)
+    conn = storage.connect(DB_NAME)
     c = conn.cursor()
 
     query = '''SELECT date, SUM(count), GROUP_CONCAT(id)
@@ -688,39 +1003,98 @@ def send_reminder(user_id):
     loop.close()
 
 # -------------
+# Подписчики, у которых по их часовому поясу наступило время напоминания и
+# нет записи за их сегодняшний день. SQLite понимает смещение '+03:00' как
+# модификатор даты, а для неверного возвращает NULL - тогда, как и раньше,
+# берётся +03:00; last_active_date поддерживается всеми приложениями при записи.
+DUE_REMINDERS_QUERY = '''SELECT s.user_id
+                          FROM user_settings s
+                          LEFT JOIN user_activity a ON a.user_id = s.user_id
+                          WHERE s.reminders_enabled = 1
+                            AND s.reminder_time = COALESCE(strftime('%H:%M', 'now', s.timezone),
+                                                           strftime('%H:%M', 'now', '+03:00'))
+                            AND (a.last_active_date IS NULL
+                                 OR a.last_active_date < COALESCE(date('now', s.timezone),
+                                                                  date('now', '+03:00')))'''
+
 def check_and_remind():
     """Синхронная функция для проверки и отправки напоминаний с учетом часового пояса"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT user_id, reminder_time, timezone FROM user_settings WHERE reminders_enabled=1")
-    users = c.fetchall()
-    
-    for user_id, reminder_time, timezone in users:
+    conn = storage.connect(DB_NAME)
+    user_ids = [row[0] for row in conn.execute(DUE_REMINDERS_QUERY)]
+    conn.close()
+
+    for user_id in user_ids:
+        threading.Thread(target=send_reminder, args=(user_id,)).start()
+
+def timed_check_and_remind():
+    with metrics.timer(scheduler_job_seconds, job='check_and_remind'):
+        check_and_remind()
+
+# -------------
+# Оповещения об отклонениях ставит в очередь anomaly_alerts любое приложение при
+# записи. Отправляются не раньше чем через ANOMALY_ALERT_DELAY_MINUTES: если за это
+# время день дополнят до нормы, оповещение снимется.
+ANOMALY_ALERT_DELAY_MINUTES = int(os.getenv("ANOMALY_ALERT_DELAY_MINUTES", 30))
+
+anomaly_alerts_sent = metrics.registry.counter(
+    'tenhens_anomaly_alerts_total', 'Оповещения об отклонениях яйценоскости', ('result',))
+
+def format_anomaly_alert(day, total, mean):
+    if total < mean:
+        return (f"⚠️ {day}: куры снесли заметно меньше обычного — {total} яиц "
+                f"при среднем {mean:.1f}.\n"
+                "Стоит проверить корм, воду, освещение и здоровье птиц. "
+                "Если запись неполная, дополните её — /stats покажет итог дня.")
+    return (f"📈 {day}: куры снесли заметно больше обычного — {total} яиц "
+            f"при среднем {mean:.1f}.\n"
+            "Если это опечатка, исправьте запись командой /edit.")
+
+async def send_anomaly_alerts_async(bot, alerts):
+    blocked = []
+    for user_id, day, total, mean, _ in alerts:
         try:
-            if has_today_entry(user_id):
-                continue
-                
-            hour, minute = map(int, reminder_time.split(':'))
-            
-            # Получаем текущее время с учетом часового пояса пользователя
-            try:
-                tz_offset = int(timezone[:3])  # Преобразуем "+03:00" в 3
-            except:
-                tz_offset = 3  # Значение по умолчанию, если часовой пояс некорректен
-                
-            now = datetime.utcnow() + timedelta(hours=tz_offset)
-            
-            if now.hour == hour and now.minute == minute:
-                threading.Thread(target=send_reminder, args=(user_id,)).start()
+            await bot.send_message(chat_id=user_id, text=format_anomaly_alert(day, total, mean))
+            anomaly_alerts_sent.inc(result='sent')
+        except Forbidden:
+            blocked.append(user_id)
+            anomaly_alerts_sent.inc(result='blocked')
         except Exception as e:
-            print(f"Ошибка при проверке напоминания для {user_id}: {str(e)}")
-    
+            anomaly_alerts_sent.inc(result='failed')
+            print(f"Ошибка при отправке оповещения пользователю {user_id}: {str(e)}")
+    mark_blocked(blocked)
+
+def check_anomaly_alerts():
+    created_before = (datetime.now() - timedelta(minutes=ANOMALY_ALERT_DELAY_MINUTES)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = storage.connect(DB_NAME)
+    alerts = anomalies.query_pending_alerts(conn, created_before)
+    # Отмечаем до отправки: оповещение не уйдёт дважды, даже если отправка упадёт
+    anomalies.mark_sent(conn, [(user_id, day) for user_id, day, _, _, _ in alerts])
+    conn.commit()
     conn.close()
+    if not alerts:
+        return
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(send_anomaly_alerts_async(Bot(token=TOKEN), alerts))
+    loop.close()
+
+def timed_check_anomaly_alerts():
+    with metrics.timer(scheduler_job_seconds, job='check_anomaly_alerts'):
+        check_anomaly_alerts()
+
+def record_scheduler_lag(event):
+    # Насколько позже расписания задача передана на выполнение
+    for scheduled in event.scheduled_run_times:
+        lag = (datetime.now(scheduled.tzinfo) - scheduled).total_seconds()
+        scheduler_lag.observe(max(lag, 0), job=event.job_id)
 
 def start_scheduler():
     """Запуск планировщика в фоновом режиме"""
     scheduler = BackgroundScheduler()
-    scheduler.add_job(check_and_remind, 'interval', minutes=1)
+    scheduler.add_listener(record_scheduler_lag, EVENT_JOB_SUBMITTED)
+    scheduler.add_job(timed_check_and_remind, 'interval', minutes=1, id='check_and_remind')
+    scheduler.add_job(timed_check_anomaly_alerts, 'interval', minutes=1, id='check_anomaly_alerts')
     scheduler.start()
     print("Планировщик напоминаний запущен")
     
@@ -732,16 +1106,23 @@ def start_scheduler():
         scheduler.shutdown()
 
 # Функции для управления напоминаниями
-def get_user_settings(user_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT reminders_enabled, reminder_time, timezone FROM user_settings WHERE user_id=?", (user_id,))
-    settings = c.fetchone()
-    conn.close()
+def read_user_settings(conn, user_id):
+    settings = conn.execute(
+        "SELECT reminders_enabled, reminder_time, timezone FROM user_settings WHERE user_id=?", (user_id,)
+    ).fetchone()
     return settings or (False, '20:00', '+03:00')  # Возвращаем время и часовой пояс по умолчанию
 
+def get_user_settings(user_id):
+    # Настройки меняет только бот, поэтому кэш обновляется в update_user_settings
+    entry = hot_entry(user_id)
+    if entry['settings'] is None:
+        conn = storage.connect(DB_NAME)
+        entry['settings'] = read_user_settings(conn, user_id)
+        conn.close()
+    return entry['settings']
+
 def update_user_settings(user_id, reminders_enabled=None, reminder_time=None, timezone=None):
-    conn = sqlite3.connect(DB_NAME)
+    conn = storage.connect(DB_NAME)
     c = conn.cursor()
     
     if not c.execute("SELECT 1 FROM user_settings WHERE user_id=?", (user_id,)).fetchone():
@@ -765,8 +1146,10 @@ def update_user_settings(user_id, reminders_enabled=None, reminder_time=None, ti
         params.append(user_id)
         c.execute(query, params)
     
+    settings = read_user_settings(conn, user_id)
     conn.commit()
     conn.close()
+    hot_entry(user_id)['settings'] = settings
 
 async def manage_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message is None or update.message.from_user is None:
@@ -804,10 +1187,10 @@ async def manage_reminders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif action == "time" and len(args) > 1:
         try:
             # Проверка формата времени
-            datetime.strptime(args[1], "%H:%M")
-            update_user_settings(user_id, reminder_time=args[1])
+            reminder_time = datetime.strptime(args[1], "%H:%M").strftime("%H:%M")
+            update_user_settings(user_id, reminder_time=reminder_time)
             await update.message.reply_text(
-                f"⏰ Время напоминания установлено на {args[1]} (UTC{timezone})"
+                f"⏰ Время напоминания установлено на {reminder_time} (UTC{timezone})"
             )
         except ValueError:
             await update.message.reply_text("❌ Неверный формат времени! Используйте ЧЧ:ММ")
@@ -839,26 +1222,11 @@ def create_reply_keyboard():
 # ______________________________________________________________________________________________
 # Получение общей статистики
 def get_general_stats():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    c.execute("SELECT COUNT(DISTINCT user_id) FROM eggs")
-    total_users = c.fetchone()[0]
-    
-    c.execute("SELECT COUNT(*), SUM(count) FROM eggs")
-    total_records, total_eggs = c.fetchone()
-    
-    c.execute("SELECT COUNT(DISTINCT user_id) FROM eggs WHERE date >= date('now', '-7 days')")
-    active_users = c.fetchone()[0]
-    
+    # Итоги поддерживаются при каждой записи: здесь только чтение пары строк
+    conn = storage.connect(DB_NAME)
+    stats = storage.query_global_stats(conn, active_days=7)
     conn.close()
-    
-    return {
-        "total_users": total_users or 0,
-        "total_records": total_records or 0,
-        "total_eggs": total_eggs or 0,
-        "active_users": active_users or 0
-    }
+    return stats
 
 # Показать общую статистику
 async def show_general_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -875,26 +1243,99 @@ async def show_general_stats(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
     await update.message.reply_text(response)
 
+# Список пользователей постранично: курсор страницы передаётся в callback_data кнопок
+USERS_PAGE_SIZE = 20
+USERS_PAGE_CACHE_SECONDS = int(os.getenv("USERS_PAGE_CACHE_SECONDS", 30))
+USERS_PAGE_CACHE_MAX_ENTRIES = 256
+USERS_ORDER_TITLES = {
+    'entries': "по числу записей",
+    'recent': "по последней записи",
+}
+# Индекс ключа сортировки в строке (user_id, entries, last_active_date)
+USERS_ORDER_KEYS = {'entries': 1, 'recent': 2}
+
+users_page_cache = {}
+
+def get_users_page(order, cursor=None, backward=False):
+    """Страница списка пользователей; одинаковые нажатия в течение пары секунд не ходят в БД"""
+    key = (order, cursor, backward)
+    now = time.monotonic()
+    cached = users_page_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    conn = storage.connect(DB_NAME)
+    page = storage.query_user_activity_page(conn, order, cursor, backward, USERS_PAGE_SIZE)
+    conn.close()
+
+    if len(users_page_cache) >= USERS_PAGE_CACHE_MAX_ENTRIES:
+        users_page_cache.clear()
+    users_page_cache[key] = (now + USERS_PAGE_CACHE_SECONDS, page)
+    return page
+
+def users_page_data(order, page, row, backward):
+    # users:<сортировка>:<номер страницы>:<f|b>:<ключ>:<user_id> - не длиннее 64 байт
+    key = row[USERS_ORDER_KEYS[order]]
+    return f"users:{order}:{page}:{'b' if backward else 'f'}:{key}:{row[0]}"
+
+def parse_users_page_data(data):
+    parts = data.split(':')
+    order, page = parts[1], int(parts[2])
+    if len(parts) < 6:
+        return order, page, None, False
+    key = int(parts[4]) if order == 'entries' else parts[4]
+    return order, page, (key, int(parts[5])), parts[3] == 'b'
+
+def render_users_page(order='entries', page=0, cursor=None, backward=False):
+    """Текст и кнопки страницы списка пользователей"""
+    rows, has_more = get_users_page(order, cursor, backward)
+    if not rows:
+        return None, None
+
+    lines = [f"👥 Пользователи {USERS_ORDER_TITLES[order]}, стр. {page + 1}:\n"]
+    for idx, (user_id, entries, last_active_date) in enumerate(rows, page * USERS_PAGE_SIZE + 1):
+        lines.append(f"{idx}. ID: {user_id} - Записей: {entries}, последняя: {last_active_date}")
+
+    # При обходе назад has_more говорит о предыдущих страницах, а следующая есть всегда
+    has_next = True if backward else has_more
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(
+            "◀️ Назад", callback_data=users_page_data(order, page - 1, rows[0], backward=True)))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            "Вперёд ▶️", callback_data=users_page_data(order, page + 1, rows[-1], backward=False)))
+    other = 'recent' if order == 'entries' else 'entries'
+    sorting = [InlineKeyboardButton(f"↕️ {USERS_ORDER_TITLES[other].capitalize()}", callback_data=f"users:{other}:0")]
+
+    keyboard = [navigation, sorting] if navigation else [sorting]
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
 # Получить список пользователей
 async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.message.from_user.id):
         return
-    
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT user_id, COUNT(*) as entries FROM eggs GROUP BY user_id ORDER BY entries DESC")
-    users = c.fetchall()
-    conn.close()
-    
-    if not users:
+
+    text, markup = render_users_page()
+    if text is None:
         await update.message.reply_text("❌ Нет данных о пользователях")
         return
-    
-    response = "👥 Список пользователей:\n\n"
-    for idx, (user_id, entries) in enumerate(users, 1):
-        response += f"{idx}. ID: {user_id} - Записей: {entries}\n"
-    
-    await update.message.reply_text(response)
+
+    await update.message.reply_text(text, reply_markup=markup)
+
+# Переход по страницам списка пользователей
+async def users_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not is_admin(query.from_user.id):
+        await query.answer("❌ Доступ запрещен!")
+        return
+
+    await query.answer()
+    text, markup = render_users_page(*parse_users_page_data(query.data))
+    if text is None:
+        await query.edit_message_text("❌ Нет данных о пользователях")
+        return
+    await query.edit_message_text(text, reply_markup=markup)
 
 # Рассылка сообщений
 async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -911,25 +1352,7 @@ async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message.text
     
-    # Получаем список пользователей
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT user_id FROM eggs")
-    user_ids = [row[0] for row in c.fetchall()]
-    conn.close()
-    
-    success = 0
-    failed = 0
-    
-    for uid in user_ids:
-        try:
-            await context.bot.send_message(
-                chat_id=uid,
-                text=f"📢 Сообщение от администратора:\n\n{message}"
-            )
-            success += 1
-        except Exception:
-            failed += 1
+    success, failed = await send_broadcast(context.bot, message)
     
     await update.message.reply_text(
         f"✅ Рассылка завершена!\n"
@@ -949,24 +1372,7 @@ async def handle_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message.text
     context.user_data.pop('awaiting_broadcast', None)  # Сразу очищаем флаг
     
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT user_id FROM eggs")
-    user_ids = [row[0] for row in c.fetchall()]
-    conn.close()
-    
-    success = 0
-    failed = 0
-    
-    for uid in user_ids:
-        try:
-            await context.bot.send_message(
-                chat_id=uid,
-                text=f"📢 Сообщение от администратора:\n\n{message}"
-            )
-            success += 1
-        except Exception:
-            failed += 1
+    success, failed = await send_broadcast(context.bot, message)
     
     await update.message.reply_text(
         f"✅ Рассылка завершена!\n"
@@ -990,6 +1396,47 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
     )
 
+# Профилирование одной команды: /profile graph 30
+def find_command_handler(application, command):
+    for group_handlers in application.handlers.values():
+        for handler in group_handlers:
+            if isinstance(handler, CommandHandler) and command in handler.commands:
+                return handler
+    return None
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.message.from_user.id):
+        return
+    if not context.args:
+        await update.message.reply_text("Используйте: /profile <команда> [аргументы], например /profile graph 30")
+        return
+
+    command = context.args[0].lstrip('/').lower()
+    handler = find_command_handler(context.application, command) if command != 'profile' else None
+    if handler is None:
+        await update.message.reply_text(f"❌ Команда /{command} не найдена")
+        return
+
+    # Команда выполняется от имени администратора с остальными аргументами.
+    # Профилировщик работает и во время await, поэтому в отчёт могут попасть
+    # обновления, обработанные параллельно.
+    context.args = context.args[1:]
+    started = time.perf_counter()
+    profiler = profiling.start()
+    try:
+        await handler.callback(update, context)
+    finally:
+        profiler.disable()
+    elapsed = time.perf_counter() - started
+
+    await update.message.reply_document(
+        document=profiling.dump_bytes(profiler),
+        filename=f"{command}.prof",
+        caption=f"⏱ /{command}: {elapsed * 1000:.0f} мс. Дамп pstats: snakeviz, flameprof или python -m pstats"
+    )
+    report = profiling.report(profiler, limit=15)
+    await update.message.reply_text(report[:4000])
+
 async def cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.pop('awaiting_broadcast', None)
     await update.message.reply_text("❌ Рассылка отменена")
@@ -1020,10 +1467,14 @@ def main():
         }
     )
     
+    # Каждый написавший боту попадает в получатели рассылок
+    application.add_handler(TypeHandler(Update, track_user), group=-1)
+
     application.add_handler(conv_handler)
 
     # Добавляем обработчики администратора ВЫШЕ обычных
     application.add_handler(CommandHandler("admin", admin_panel))
+    application.add_handler(CommandHandler("profile", profile_command))
     application.add_handler(MessageHandler(
         filters.Text(["📊 Общая статистика"]) & filters.ChatType.PRIVATE, 
         show_general_stats
@@ -1032,6 +1483,7 @@ def main():
         filters.Text(["👥 Список пользователей"]) & filters.ChatType.PRIVATE, 
         list_users
     ))
+    application.add_handler(CallbackQueryHandler(users_page_callback, pattern=r"^users:"))
 
     # Добавляем обработчики пользовательских команд
     application.add_handler(CommandHandler("start", start))
@@ -1042,6 +1494,7 @@ def main():
     application.add_handler(CommandHandler("graph", show_graph))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(CommandHandler("analytics", show_analytics))
+    application.add_handler(CommandHandler("forecast", show_forecast))
     application.add_handler(CommandHandler("export", export_data))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("donate", donate))
@@ -1050,6 +1503,12 @@ def main():
     
     # Добавить функцию отмены рассылки
 
+    # Время каждого обработчика попадает в /metrics
+    for group_handlers in application.handlers.values():
+        instrument_handlers(group_handlers)
+    if METRICS_PORT:
+        metrics.serve_metrics(METRICS_HOST, METRICS_PORT)
+
     # Запускаем бота в режиме опроса
     print("Бот запущен. Ожидание сообщений...")
     application.run_polling()
@@ -0,0 +1,13 @@
+"""Общая логика сервиса «Десять курочек» для веб-приложения, бота и Streamlit.
+
+storage   - схема SQLite, запросы и запись яйценоскости
+analytics - средние, тренд и частые слова в заметках
+forecast  - прогноз по дневным суммам с инкрементальным обновлением моделей
+anomalies - обнаружение резких отклонений при записи и очередь оповещений
+rendering - построение графиков в PNG
+security  - хэширование паролей и ответов на секретный вопрос
+metrics   - метрики в формате Prometheus
+profiling - cProfile для отдельного запроса по требованию
+"""
+
+__version__ = '0.1.0'
@@ -0,0 +1,53 @@
+"""Аналитика яйценоскости по записям пользователя"""
+from .lazy import np, stats
+from .storage import query_all_records
+
+
+def compute_analytics(records, days):
+    """Среднее, тренд, рекорд и частые слова за последние days записей.
+
+    records - (date, count, notes) по возрастанию даты. Для сравнения
+    берутся столько же предыдущих записей (или сколько есть).
+    """
+    if not records or len(records) < 2:
+        return None
+
+    days = min(days, len(records))
+    current = records[-days:]
+    previous = records[max(0, len(records) - days * 2):len(records) - days]
+
+    current_counts = [row[1] for row in current]
+    avg_current = np.mean(current_counts)
+    avg_previous = np.mean([row[1] for row in previous]) if previous else 0
+
+    if len(current_counts) > 1:
+        slope, _, _, _, _ = stats.linregress(np.arange(len(current_counts)), current_counts)
+        trend = slope * len(current_counts)
+    else:
+        trend = 0
+
+    max_day = max(current, key=lambda row: row[1])
+    min_day = min(current, key=lambda row: row[1])
+
+    word_analysis = {}
+    for row in current:
+        if not row[2]:
+            continue
+        for word in row[2].lower().split():
+            if len(word) > 2:  # Игнорируем короткие слова
+                word_analysis[word] = word_analysis.get(word, 0) + 1
+
+    top_words = sorted(word_analysis.items(), key=lambda x: x[1], reverse=True)[:3]
+
+    return {
+        'current_avg': float(avg_current),
+        'previous_avg': float(avg_previous),
+        'trend': float(trend),
+        'max_day': (max_day[0], int(max_day[1])),
+        'min_day': (min_day[0], int(min_day[1])),
+        'top_words': top_words
+    }
+
+
+def query_analytics(conn, user_id, days):
+    return compute_analytics(query_all_records(conn, user_id), days)
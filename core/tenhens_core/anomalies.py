@@ -0,0 +1,204 @@
+"""Обнаружение резких отклонений яйценоскости прямо при записи.
+
+Для каждого пользователя хранится среднее и дисперсия дневных сумм за
+ANOMALY_WINDOW_DAYS дней перед последним днём с записями (алгоритм
+Уэлфорда с добавлением и удалением значений). При каждой записи состояние
+поправляется только на изменённые дни и на дни, вошедшие в окно или
+вышедшие из него, после чего последний день сравнивается со средним.
+Если отклонение больше ANOMALY_Z_THRESHOLD стандартных отклонений, в
+anomaly_alerts ставится оповещение, которое отправляет бот.
+
+Функции вызываются из storage в транзакции записи и не делают commit.
+"""
+import math
+import os
+from datetime import date as Date, datetime, timedelta
+
+# Порог отклонения в стандартных отклонениях
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 3))
+# Сколько дней перед последним днём с записями образуют норму
+ANOMALY_WINDOW_DAYS = int(os.getenv('ANOMALY_WINDOW_DAYS', 28))
+# Меньше дней с записями в окне - нормы ещё нет, оповещений нет
+ANOMALY_MIN_DAYS = 7
+# Нижняя граница стандартного отклонения, яиц: при одинаковых суммах
+# каждый день любое изменение было бы бесконечным отклонением
+ANOMALY_MIN_STD = 1.0
+
+
+def _shift(day, days):
+    return (Date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+# ==================== WELFORD ====================
+
+def _add(state, value):
+    state['days'] += 1
+    delta = value - state['mean']
+    state['mean'] += delta / state['days']
+    state['m2'] += delta * (value - state['mean'])
+
+
+def _remove(state, value):
+    if state['days'] <= 1:
+        state.update(days=0, mean=0.0, m2=0.0)
+        return
+    old_mean = state['mean']
+    state['days'] -= 1
+    state['mean'] = (old_mean * (state['days'] + 1) - value) / state['days']
+    # Ошибки округления не должны делать дисперсию отрицательной
+    state['m2'] = max(state['m2'] - (value - old_mean) * (value - state['mean']), 0.0)
+
+
+def std(state):
+    if state['days'] < 2:
+        return 0.0
+    return math.sqrt(state['m2'] / (state['days'] - 1))
+
+# ==================== STATE ====================
+
+def day_totals(conn, user_id, dates):
+    """Суммы по дням {date: total}; None - в этот день записей нет.
+
+    Записи без количества (NULL в старых данных) считаются нулём.
+    """
+    totals = dict.fromkeys(dates)
+    if not totals:
+        return totals
+    placeholders = ', '.join('?' * len(totals))
+    totals.update(conn.execute(
+        f'''SELECT date, COALESCE(SUM(count), 0) FROM eggs
+            WHERE user_id = ? AND date IN ({placeholders})
+            GROUP BY date''',
+        [user_id] + sorted(totals)
+    ).fetchall())
+    return totals
+
+
+def _range_totals(conn, user_id, first_day, end_day):
+    """Суммы дней first_day <= date < end_day"""
+    if first_day >= end_day:
+        return []
+    return [row[0] for row in conn.execute(
+        '''SELECT COALESCE(SUM(count), 0) FROM eggs
+           WHERE user_id = ? AND date >= ? AND date < ?
+           GROUP BY date''',
+        (user_id, first_day, end_day)
+    ).fetchall()]
+
+
+def load_state(conn, user_id):
+    row = conn.execute(
+        'SELECT days, mean, m2, open_date FROM anomaly_state WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {'days': row[0], 'mean': row[1], 'm2': row[2], 'open_date': row[3]}
+
+
+def save_state(conn, user_id, state):
+    conn.execute(
+        'INSERT OR REPLACE INTO anomaly_state (user_id, days, mean, m2, open_date) VALUES (?, ?, ?, ?, ?)',
+        (user_id, state['days'], state['mean'], state['m2'], state['open_date'])
+    )
+
+
+def rebuild_state(conn, user_id, open_date):
+    """Состояние по окну перед open_date: не больше ANOMALY_WINDOW_DAYS дневных сумм"""
+    state = {'days': 0, 'mean': 0.0, 'm2': 0.0, 'open_date': open_date}
+    if open_date is not None:
+        for total in _range_totals(conn, user_id, _shift(open_date, -ANOMALY_WINDOW_DAYS), open_date):
+            _add(state, total)
+    return state
+
+
+def reset(conn):
+    """Сбросить состояния всех пользователей (после загрузки в обход storage), пересчитаются при записи"""
+    conn.execute('DELETE FROM anomaly_state')
+
+# ==================== WRITE PATH ====================
+
+def observe(conn, user_id, before):
+    """Учесть запись, изменившую дни из before, и проверить последний день.
+
+    before - day_totals затронутых дней до записи. Стоимость не зависит от
+    длины истории: несколько запросов по индексу и O(1) обновлений на день,
+    вошедший в окно или вышедший из него.
+    """
+    after = day_totals(conn, user_id, before.keys())
+    open_date = conn.execute('SELECT MAX(date) FROM eggs WHERE user_id = ?', (user_id,)).fetchone()[0]
+    state = load_state(conn, user_id)
+
+    if state is None or state['open_date'] is None or open_date is None or open_date < state['open_date']:
+        # Первая запись или удалён последний день: окно собирается заново
+        state = rebuild_state(conn, user_id, open_date)
+    else:
+        window_start = _shift(state['open_date'], -ANOMALY_WINDOW_DAYS)
+        for day in before:
+            if window_start <= day < state['open_date']:
+                if before[day] is not None:
+                    _remove(state, before[day])
+                if after[day] is not None:
+                    _add(state, after[day])
+        if open_date > state['open_date']:
+            new_start = _shift(open_date, -ANOMALY_WINDOW_DAYS)
+            for total in _range_totals(conn, user_id, window_start, min(new_start, state['open_date'])):
+                _remove(state, total)
+            for total in _range_totals(conn, user_id, max(state['open_date'], new_start), open_date):
+                _add(state, total)
+            state['open_date'] = open_date
+    save_state(conn, user_id, state)
+
+    # Дни, где не осталось записей, больше не отклоняются
+    removed = [day for day, total in after.items() if total is None and before[day] is not None]
+    if removed:
+        conn.executemany(
+            'DELETE FROM anomaly_alerts WHERE user_id = ? AND date = ? AND sent_at IS NULL',
+            [(user_id, day) for day in removed]
+        )
+    if after.get(open_date) is not None:
+        check_day(conn, user_id, state, open_date, after[open_date])
+
+
+def check_day(conn, user_id, state, day, total):
+    """Поставить или снять оповещение по сумме дня"""
+    if state['days'] < ANOMALY_MIN_DAYS:
+        return
+    deviation = max(std(state), ANOMALY_MIN_STD)
+    z = (total - state['mean']) / deviation
+    if abs(z) < ANOMALY_Z_THRESHOLD:
+        # День дополнили до нормы, пока оповещение ждало отправки
+        conn.execute(
+            'DELETE FROM anomaly_alerts WHERE user_id = ? AND date = ? AND sent_at IS NULL',
+            (user_id, day)
+        )
+        return
+    conn.execute(
+        '''INSERT INTO anomaly_alerts (user_id, date, total, mean, std, z, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(user_id, date) DO UPDATE SET total = excluded.total,
+                                                    mean = excluded.mean,
+                                                    std = excluded.std,
+                                                    z = excluded.z
+           WHERE sent_at IS NULL''',
+        (user_id, day, total, state['mean'], deviation, z, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    )
+
+# ==================== ALERTS ====================
+
+def query_pending_alerts(conn, created_before, limit=100):
+    """Неотправленные оповещения, поставленные раньше created_before: (user_id, date, total, mean, z)"""
+    return conn.execute(
+        '''SELECT user_id, date, total, mean, z FROM anomaly_alerts
+           WHERE sent_at IS NULL AND created_at <= ?
+           ORDER BY created_at
+           LIMIT ?''',
+        (created_before, limit)
+    ).fetchall()
+
+
+def mark_sent(conn, alerts):
+    """Отметить оповещения (user_id, date) отправленными"""
+    sent_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany(
+        'UPDATE anomaly_alerts SET sent_at = ? WHERE user_id = ? AND date = ?',
+        [(sent_at, user_id, day) for user_id, day in alerts]
+    )
@@ -0,0 +1,337 @@
+"""Прогноз яйценоскости по дневным суммам пользователя.
+
+Две модели считаются параллельно: демпфированное экспоненциальное
+сглаживание Холта (уровень и тренд) и сезонно-наивная модель с недельным
+периодом. Для прогноза берётся та, у которой меньше ошибка прогноза на
+шаг вперёд по истории.
+
+Параметры и состояние модели хранятся в таблице forecast_models. Когда
+появляются записи за новые дни, состояние досчитывается только по этим
+дням; полная подгонка нужна, если изменились уже учтённые дни. Пакетная
+переподгонка всех пользователей - refit_all или
+
+    python -m tenhens_core.forecast --db /app/data/egg_database.db
+"""
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as Date
+
+from . import storage
+from .lazy import np
+
+# Сколько последних дней истории берётся для подгонки
+FIT_WINDOW_DAYS = 365
+# Меньше дней истории - прогноз не строится
+MIN_HISTORY_DAYS = 14
+MAX_HORIZON_DAYS = 90
+# Период сезонно-наивной модели: неделя
+SEASON_DAYS = 7
+# Затухание тренда: прогноз выходит на постоянный уровень, а не растёт бесконечно
+DAMPING = 0.98
+# Сетка параметров сглаживания уровня (alpha) и тренда (beta)
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+BETAS = (0.01, 0.05, 0.1, 0.2, 0.3, 0.5)
+# Ширина интервала прогноза в стандартных отклонениях (~95%)
+INTERVAL_Z = 1.96
+# Пользователей в одной задаче пакетной переподгонки
+REFIT_CHUNK_USERS = 200
+
+
+def _day_number(day):
+    return Date.fromisoformat(day).toordinal()
+
+
+def _day_string(number):
+    return Date.fromordinal(number).isoformat()
+
+# ==================== SERIES ====================
+
+def query_daily_series(conn, user_id, after=None):
+    """Дневные суммы (date, total) по возрастанию; after - только дни позже этой даты"""
+    if after is None:
+        after = storage.period_start(FIT_WINDOW_DAYS + 1)
+        # Окно отсчитывается от последней записи, а не от сегодняшнего дня
+        last = conn.execute('SELECT MAX(date) FROM eggs WHERE user_id = ?', (user_id,)).fetchone()[0]
+        if last:
+            after = _day_string(_day_number(last) - FIT_WINDOW_DAYS)
+    return [tuple(row) for row in conn.execute(
+        '''SELECT date, SUM(count) FROM eggs
+           WHERE user_id = ? AND date > ?
+           GROUP BY date
+           ORDER BY date''',
+        (user_id, after)
+    ).fetchall()]
+
+
+def fill_days(rows, anchor=None):
+    """Непрерывный ряд по дням: пропуски заполняются линейной интерполяцией.
+
+    anchor - (номер дня, значение) последнего уже учтённого дня, от него
+    интерполируются пропуски перед первой строкой rows.
+    """
+    days = np.array([_day_number(day) for day, _ in rows], dtype=float)
+    values = np.array([total for _, total in rows], dtype=float)
+    if anchor is not None:
+        days = np.concatenate(([anchor[0]], days))
+        values = np.concatenate(([anchor[1]], values))
+    grid = np.arange(days[0], days[-1] + 1)
+    series = np.interp(grid, days, values)
+    if anchor is not None:
+        series = series[1:]
+    return series
+
+
+def window_checksum(conn, user_id, first_day, last_day):
+    """Отпечаток записей за учтённые дни: число, сумма и сумма, взвешенная датой.
+
+    Считается по покрывающему индексу eggs (user_id, date, count).
+    """
+    row = conn.execute(
+        '''SELECT COUNT(*), COALESCE(SUM(count), 0),
+                  COALESCE(SUM(count * CAST(julianday(date) AS INTEGER)), 0)
+           FROM eggs
+           WHERE user_id = ? AND date >= ? AND date <= ?''',
+        (user_id, first_day, last_day)
+    ).fetchone()
+    return list(row)
+
+# ==================== MODELS ====================
+
+def _fit_holt(series):
+    """Подбор alpha и beta по сетке: все пары считаются одновременно векторами numpy.
+
+    Возвращает параметры с минимальной суммой квадратов ошибок на шаг вперёд
+    и состояние (уровень, тренд) после последнего дня.
+    """
+    alpha, beta = np.meshgrid(np.array(ALPHAS), np.array(BETAS))
+    alpha = alpha.ravel()
+    beta = beta.ravel()
+    level = np.full(alpha.shape, series[0])
+    trend = np.full(alpha.shape, series[1] - series[0])
+    sse = np.zeros(alpha.shape)
+    for value in series[1:]:
+        predicted = level + DAMPING * trend
+        error = value - predicted
+        sse += error * error
+        level = predicted + alpha * error
+        trend = DAMPING * trend + alpha * beta * error
+    best = int(np.argmin(sse))
+    return {
+        'alpha': float(alpha[best]),
+        'beta': float(beta[best]),
+        'level': float(level[best]),
+        'trend': float(trend[best]),
+        'sse': float(sse[best]),
+    }
+
+
+def _naive_sse(series):
+    errors = series[SEASON_DAYS:] - series[:-SEASON_DAYS]
+    return float(np.dot(errors, errors))
+
+
+def fit(rows):
+    """Подогнать модель по дневным суммам (date, total) или None, если истории мало"""
+    if not rows:
+        return None
+    series = fill_days(rows)
+    if len(series) < MIN_HISTORY_DAYS:
+        return None
+    holt = _fit_holt(series)
+    return {
+        'alpha': holt['alpha'],
+        'beta': holt['beta'],
+        'level': holt['level'],
+        'trend': holt['trend'],
+        'season': [float(v) for v in series[-SEASON_DAYS:]],
+        'holt_sse': holt['sse'],
+        'holt_n': len(series) - 1,
+        'naive_sse': _naive_sse(series),
+        'naive_n': len(series) - SEASON_DAYS,
+        'first_date': rows[0][0],
+        'last_date': rows[-1][0],
+    }
+
+
+def advance(model, series):
+    """Досчитать состояние модели по новым дням: O(1) на день, без подгонки параметров"""
+    alpha, beta = model['alpha'], model['beta']
+    level, trend = model['level'], model['trend']
+    season = list(model['season'])
+    for value in series:
+        value = float(value)
+        predicted = level + DAMPING * trend
+        error = value - predicted
+        model['holt_sse'] += error * error
+        model['holt_n'] += 1
+        level = predicted + alpha * error
+        trend = DAMPING * trend + alpha * beta * error
+
+        naive_error = value - season[0]
+        model['naive_sse'] += naive_error * naive_error
+        model['naive_n'] += 1
+        season = season[1:] + [value]
+    model['level'], model['trend'], model['season'] = level, trend, season
+    return model
+
+
+def predict(model, horizon):
+    """Прогноз на horizon дней после последнего учтённого дня"""
+    holt_mse = model['holt_sse'] / max(model['holt_n'], 1)
+    naive_mse = model['naive_sse'] / max(model['naive_n'], 1)
+    steps = np.arange(1, horizon + 1)
+    if holt_mse <= naive_mse:
+        method = 'holt'
+        # Сумма DAMPING^1..DAMPING^h: вклад затухающего тренда за h шагов
+        damped = np.cumsum(DAMPING ** steps)
+        values = model['level'] + damped * model['trend']
+        spread = INTERVAL_Z * math.sqrt(holt_mse) * np.sqrt(steps)
+    else:
+        method = 'seasonal_naive'
+        values = np.array(model['season'])[(steps - 1) % SEASON_DAYS]
+        spread = INTERVAL_Z * math.sqrt(naive_mse) * np.sqrt(np.ceil(steps / SEASON_DAYS))
+    values = np.clip(values, 0, None)
+    start = _day_number(model['last_date'])
+    return {
+        'method': method,
+        'last_date': model['last_date'],
+        'points': [
+            {
+                'date': _day_string(start + step),
+                'count': round(float(value), 1),
+                'low': round(float(max(value - delta, 0)), 1),
+                'high': round(float(value + delta), 1),
+            }
+            for step, value, delta in zip(steps.tolist(), values, spread)
+        ],
+    }
+
+# ==================== CACHE ====================
+
+def _split_open_day(rows):
+    """Последний день с записями ещё может пополниться: в сохранённое состояние он не входит"""
+    return rows[:-1], rows[-1:]
+
+
+def build_model(conn, user_id):
+    """Полная подгонка по окну истории: (модель или None, открытый день)"""
+    rows = query_daily_series(conn, user_id)
+    closed, open_day = _split_open_day(rows)
+    model = fit(closed)
+    if model is not None:
+        model['checksum'] = window_checksum(conn, user_id, model['first_date'], model['last_date'])
+    return model, open_day
+
+
+def update_model(conn, user_id, model, verify=True):
+    """Досчитать сохранённую модель по дням после model['last_date'].
+
+    Возвращает (модель, открытый день) или None, если учтённые дни
+    изменились и нужна полная подгонка. verify=False - данные не менялись
+    с сохранения модели, отпечаток можно не сверять.
+    """
+    if verify and window_checksum(conn, user_id, model['first_date'], model['last_date']) != model['checksum']:
+        return None
+    rows = query_daily_series(conn, user_id, after=model['last_date'])
+    closed, open_day = _split_open_day(rows)
+    if closed:
+        anchor = (_day_number(model['last_date']), model['season'][-1])
+        advance(model, fill_days(closed, anchor))
+        model['last_date'] = closed[-1][0]
+        model['checksum'] = window_checksum(conn, user_id, model['first_date'], model['last_date'])
+    return model, open_day
+
+
+def load_model(conn, user_id):
+    row = conn.execute('SELECT version, model FROM forecast_models WHERE user_id = ?', (user_id,)).fetchone()
+    if row is None:
+        return None, None
+    return row[0], json.loads(row[1])
+
+
+def save_model(conn, user_id, version, model):
+    conn.execute(
+        'INSERT OR REPLACE INTO forecast_models (user_id, version, model) VALUES (?, ?, ?)',
+        (user_id, version, json.dumps(model))
+    )
+
+
+def query_forecast(conn, user_id, horizon=14):
+    """Прогноз пользователя на horizon дней или None, если истории мало.
+
+    Модель берётся из forecast_models и при новых записях досчитывается
+    инкрементально; изменения сохраняются, фиксирует транзакцию вызывающий.
+    """
+    version = storage.get_data_version(conn, user_id)
+    saved_version, model = load_model(conn, user_id)
+    if saved_version == version and model is None:
+        return None
+    updated = None
+    if model is not None:
+        updated = update_model(conn, user_id, model, verify=saved_version != version)
+    if updated is None:
+        updated = build_model(conn, user_id)
+    model, open_day = updated
+    if saved_version != version or model is None:
+        save_model(conn, user_id, version, model)
+    if model is None:
+        return None
+
+    # Открытый день учитывается во временной копии состояния
+    current = model
+    if open_day:
+        current = dict(model, season=list(model['season']))
+        anchor = (_day_number(model['last_date']), model['season'][-1])
+        advance(current, fill_days(open_day, anchor))
+        current['last_date'] = open_day[0][0]
+    return predict(current, horizon)
+
+# ==================== BATCH REFIT ====================
+
+def _refit_chunk(db_name, user_ids):
+    """Подгонка моделей группы пользователей в отдельном процессе, только чтение"""
+    conn = storage.connect(db_name)
+    # Один снимок базы на всю группу: версия и данные согласованы
+    conn.execute('BEGIN')
+    results = []
+    for user_id in user_ids:
+        version = storage.get_data_version(conn, user_id)
+        model, _ = build_model(conn, user_id)
+        results.append((user_id, version, json.dumps(model)))
+    conn.rollback()
+    conn.close()
+    return results
+
+
+def refit_all(db_name=storage.DB_NAME, workers=None):
+    """Переподогнать модели всех пользователей на всех ядрах, возвращает число пользователей"""
+    conn = storage.connect(db_name)
+    storage.init_schema(conn)
+    conn.commit()
+    user_ids = [row[0] for row in conn.execute('SELECT user_id FROM user_activity ORDER BY user_id')]
+    chunks = [user_ids[i:i + REFIT_CHUNK_USERS] for i in range(0, len(user_ids), REFIT_CHUNK_USERS)]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for results in pool.map(_refit_chunk, [db_name] * len(chunks), chunks):
+            conn.executemany(
+                'INSERT OR REPLACE INTO forecast_models (user_id, version, model) VALUES (?, ?, ?)',
+                results
+            )
+    conn.commit()
+    conn.close()
+    return len(user_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пакетная переподгонка моделей прогноза')
+    parser.add_argument('--db', default=storage.DB_NAME)
+    parser.add_argument('--workers', type=int, default=0, help='число процессов, 0 - по числу ядер')
+    args = parser.parse_args()
+    print(f'Моделей переподогнано: {refit_all(args.db, args.workers or None)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Ленивая загрузка научного стека: приложения стартуют без numpy, scipy и matplotlib.
+
+Бот и утилиты загружают модули при первом обращении. Веб под gunicorn
+вызывает preload() в мастере до fork: воркеры получают уже загруженный
+стек общими страницами copy-on-write и не импортируют его заново после
+каждого перезапуска.
+"""
+import importlib
+
+
+class LazyModule:
+    """Импортирует тяжёлый модуль при первом обращении к его атрибутам"""
+
+    def __init__(self, name, setup=None):
+        self._name = name
+        self._setup = setup
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            if self._setup:
+                self._setup()
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def _use_agg_backend():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+np = LazyModule('numpy')
+stats = LazyModule('scipy.stats')
+mpl_figure = LazyModule('matplotlib.figure', setup=_use_agg_backend)
+pd = LazyModule('pandas')
+
+
+def preload(*modules):
+    """Загрузить модули сразу, по умолчанию весь научный стек"""
+    for module in modules or (np, stats, mpl_figure):
+        module._load()
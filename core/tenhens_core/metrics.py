@@ -0,0 +1,356 @@
+"""Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Значения хранятся в памяти процесса. Воркеры gunicorn отвечают на одном
+порту, и запрос /metrics попадает в случайный из них, поэтому в вебе
+включается общий каталог (enable_multiprocess, как PROMETHEUS_MULTIPROC_DIR
+у prometheus_client): каждый воркер регулярно сбрасывает туда свои
+значения, а отвечающий на /metrics складывает счётчики и гистограммы
+всех воркеров. Датчики описывают состояние процесса и не складываются:
+они отдаются по воркерам с меткой pid. Счётчики и гистограммы
+завершившихся воркеров переносятся в архив (mark_process_dead), чтобы
+суммы не уменьшались.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Границы гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(key), self._copy_value(value)] for key, value in self._values.items()]
+        return {'kind': self.kind, 'documentation': self.documentation,
+                'labelnames': list(self.labelnames), 'values': values}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def _copy_value(self, value):
+        return value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+    def _copy_value(self, value):
+        # Копия: наблюдения после снимка не должны менять сериализуемые списки
+        return [list(value[0]), value[1], value[2]]
+
+    def _render_value(self, key, value):
+        counts, total, amount = value
+        labels = _format_labels(self.labelnames, key)
+        lines = []
+        for bound, count in zip(self.buckets + ('+Inf',), counts + [total]):
+            le = 'le="%s"' % bound
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [le])} {count}')
+        lines.append(f'{self.name}_count{labels} {total}')
+        lines.append(f'{self.name}_sum{labels} {amount}')
+        return lines
+
+
+KINDS = {cls.kind: cls for cls in (Counter, Gauge, Histogram)}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def add_collector(self, callback):
+        """callback обновляет датчики перед каждым снятием значений"""
+        self._collectors.append(callback)
+
+    def collect(self):
+        for callback in self._collectors:
+            callback()
+
+    def snapshot(self):
+        self.collect()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def reset(self):
+        """Обнулить значения, например унаследованные воркером от мастера через fork"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def render(self):
+        return render_snapshot(self.snapshot())
+
+
+def render_snapshot(snapshot):
+    lines = []
+    for name, data in snapshot.items():
+        cls = KINDS[data['kind']]
+        args = (data['buckets'],) if cls is Histogram else ()
+        metric = cls(name, data['documentation'], data['labelnames'], *args)
+        metric._values = {tuple(key): value for key, value in data['values']}
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def label_process(snapshot, pid):
+    """Добавить к датчикам снимка метку pid, чтобы значения процессов не сливались"""
+    labeled = {}
+    for name, data in snapshot.items():
+        if data['kind'] == Gauge.kind:
+            data = dict(data, labelnames=list(data['labelnames']) + ['pid'],
+                        values=[[list(key) + [str(pid)], value] for key, value in data['values']])
+        labeled[name] = data
+    return labeled
+
+
+def merge_snapshots(snapshots, kinds=tuple(KINDS)):
+    """Объединить снимки процессов по меткам.
+
+    Счётчики и гистограммы складываются. Сумма датчиков бессмысленна
+    (доля попаданий, TTL), поэтому при совпадении меток берётся
+    наибольшее значение, как в режиме max у prometheus_client.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            if data['kind'] not in kinds:
+                continue
+            target = merged.setdefault(name, dict(data, values={}))
+            for key, value in data['values']:
+                key = tuple(key)
+                current = target['values'].get(key)
+                if current is None:
+                    target['values'][key] = value
+                elif data['kind'] == Histogram.kind:
+                    target['values'][key] = [[a + b for a, b in zip(current[0], value[0])],
+                                             current[1] + value[1], current[2] + value[2]]
+                elif data['kind'] == Gauge.kind:
+                    target['values'][key] = max(current, value)
+                else:
+                    target['values'][key] = current + value
+    for data in merged.values():
+        data['values'] = [[list(key), value] for key, value in sorted(data['values'].items())]
+    return merged
+
+
+registry = Registry()
+
+# ==================== MULTIPROCESS ====================
+
+# Как часто воркер сбрасывает значения в общий каталог, секунд
+FLUSH_INTERVAL_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+# Накопленные счётчики и гистограммы завершившихся процессов
+ARCHIVE_FILE = 'archive.json'
+
+multiprocess_dir = None
+
+
+def _process_file(directory, pid):
+    return os.path.join(directory, f'{pid}.json')
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path, snapshot):
+    # Запись через временный файл: читатель не увидит недописанный JSON
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def flush():
+    """Сбросить значения процесса в общий каталог"""
+    if multiprocess_dir:
+        _write(_process_file(multiprocess_dir, os.getpid()), registry.snapshot())
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        flush()
+
+
+def enable_multiprocess(directory):
+    """Включить общий каталог в воркере (gunicorn post_fork)"""
+    global multiprocess_dir
+    os.makedirs(directory, exist_ok=True)
+    multiprocess_dir = directory
+    # Значения, накопленные мастером до fork, уже не относятся к этому процессу
+    registry.reset()
+    flush()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def clear_multiprocess_dir(directory):
+    """Удалить значения прошлого запуска (gunicorn on_starting)"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+
+def mark_process_dead(directory, pid):
+    """Перенести счётчики и гистограммы завершившегося процесса в архив (gunicorn child_exit).
+
+    Датчики описывают живой процесс и отбрасываются.
+    """
+    path = _process_file(directory, pid)
+    if not os.path.exists(path):
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = merge_snapshots([_read(archive_path), _read(path)], kinds=(Counter.kind, Histogram.kind))
+    _write(archive_path, archive)
+    os.remove(path)
+
+
+def render():
+    """Текст для /metrics: значения всех процессов, если включён общий каталог"""
+    if not multiprocess_dir:
+        return registry.render()
+    flush()
+    paths = sorted(glob.glob(os.path.join(multiprocess_dir, '*.json')))
+    return render_snapshot(merge_snapshots(
+        label_process(_read(path), os.path.splitext(os.path.basename(path))[0]) for path in paths
+    ))
+
+
+class timer:
+    """Контекстный менеджер: записывает длительность блока в гистограмму"""
+
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(host, port):
+    """Отдавать /metrics на отдельном порту в фоновом потоке (бот, Streamlit)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
@@ -0,0 +1,46 @@
+"""Профилирование отдельного запроса или обработчика по требованию администратора.
+
+Дамп - двоичный формат pstats: его открывают snakeviz, tuna или flameprof
+(flamegraph), а также python -m pstats. Пока профилирование не запрошено,
+cProfile не включается и ничего не стоит.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import re
+import time
+
+# Сколько строк отчёта отдавать в текстовом виде
+REPORT_LIMIT = 30
+
+
+def start():
+    """Включить профилировщик в текущем потоке"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def dump_bytes(profiler):
+    """Дамп pstats в памяти: то же, что пишет dump_stats в файл"""
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+def save(profiler, directory, label):
+    """Сохранить дамп в directory, возвращает путь к файлу"""
+    os.makedirs(directory, exist_ok=True)
+    safe_label = re.sub(r'[^\w.-]+', '_', label).strip('_') or 'profile'
+    path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{safe_label}.prof')
+    profiler.dump_stats(path)
+    return path
+
+
+def report(profiler, limit=REPORT_LIMIT, sort='cumulative'):
+    """Самые дорогие функции текстом, как python -m pstats"""
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,55 @@
+"""Графики яйценоскости в PNG"""
+import io
+from datetime import datetime
+
+from .lazy import mpl_figure
+from .storage import pick_resolution, query_plot_points, query_series
+
+
+def query_chart(conn, user_id, days):
+    """Данные графика: (dates, counts, band, resolution) или None, если записей нет.
+
+    До DOWNSAMPLE_WEEK_DAYS точки - суммы по дням, дальше - среднее в день
+    по неделям или месяцам с полосой min/max в band.
+    """
+    resolution = pick_resolution(days)
+    band = None
+    if resolution == 'day':
+        dates, counts = query_plot_points(conn, user_id, days)
+    else:
+        data = query_series(conn, user_id, days, resolution)
+        dates = [row[0] for row in data]
+        counts = [row[2] for row in data]
+        band = ([row[3] for row in data], [row[4] for row in data])
+    if not dates:
+        return None
+    return dates, counts, band, resolution
+
+
+def render_chart(chart, days, title='Яйценоскость'):
+    """PNG с графиком из данных query_chart"""
+    dates, counts, band, resolution = chart
+    dates = [datetime.strptime(date, "%Y-%m-%d") for date in dates]
+
+    # Объектный API matplotlib не использует глобальное состояние pyplot,
+    # поэтому графики безопасно строить параллельно в потоках
+    fig = mpl_figure.Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    if band:
+        ax.fill_between(dates, band[0], band[1], color='#ff6b6b', alpha=0.2, label='Мин/макс за день')
+    ax.plot(dates, counts, marker='o', linestyle='-', color='#ff6b6b')
+    if resolution == 'day':
+        ax.set_title(f'{title} за {len(dates)} дней')
+    else:
+        period = 'неделям' if resolution == 'week' else 'месяцам'
+        ax.set_title(f'{title} за {days} дней (среднее в день по {period})')
+        ax.legend()
+    ax.set_xlabel('Дата')
+    ax.set_ylabel('Количество яиц')
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=100)
+    return buf.getvalue()
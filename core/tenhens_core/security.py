@@ -0,0 +1,62 @@
+"""Хэширование паролей и ответов на секретный вопрос"""
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Стоимость scrypt: память 128 * N * r байт на один хэш
+HASH_SCRYPT_N = int(os.getenv('HASH_SCRYPT_N', 2 ** 14))
+HASH_SCRYPT_R = int(os.getenv('HASH_SCRYPT_R', 8))
+HASH_SCRYPT_P = int(os.getenv('HASH_SCRYPT_P', 1))
+# Сколько хэшей считается одновременно: всплеск входов не занимает все ядра
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', 2))
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='kdf')
+
+
+def _scrypt(secret, salt, n, r, p):
+    return hashlib.scrypt(secret.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=32)
+
+
+def _run_kdf(secret, salt, n, r, p):
+    # hashlib.scrypt отпускает GIL, ожидание в пуле не блокирует другие потоки
+    return _hash_pool.submit(_scrypt, secret, salt, n, r, p).result()
+
+
+def hash_password(password):
+    """Солёный хэш с параметрами: scrypt$N$r$p$соль$хэш"""
+    salt = os.urandom(16)
+    digest = _run_kdf(password, salt, HASH_SCRYPT_N, HASH_SCRYPT_R, HASH_SCRYPT_P)
+    return f"scrypt${HASH_SCRYPT_N}${HASH_SCRYPT_R}${HASH_SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    """Проверяет пароль, возвращает (совпал, нужно_перехэшировать).
+
+    Старые хэши - несолёный SHA-256 - принимаются и помечаются для перехэширования.
+    """
+    if stored and stored.startswith('scrypt$'):
+        _, n, r, p, salt, digest = stored.split('$')
+        params = (int(n), int(r), int(p))
+        candidate = _run_kdf(password, bytes.fromhex(salt), *params)
+        ok = hmac.compare_digest(candidate.hex(), digest)
+        return ok, ok and params != (HASH_SCRYPT_N, HASH_SCRYPT_R, HASH_SCRYPT_P)
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    ok = hmac.compare_digest(legacy, stored or '')
+    return ok, ok
+
+
+# Хэш для несуществующих пользователей: время ответа не выдаёт, есть ли логин
+_dummy_hash = None
+_dummy_lock = threading.Lock()
+
+
+def verify_missing_user(password):
+    global _dummy_hash
+    with _dummy_lock:
+        if _dummy_hash is None:
+            _dummy_hash = hash_password('dummy-password')
+    verify_password(password, _dummy_hash)
+    return False, False
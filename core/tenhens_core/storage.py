@@ -0,0 +1,642 @@
+"""Схема и запросы к общей базе SQLite.
+
+Функции принимают открытое соединение (или курсор) и не делают commit:
+транзакцией управляет приложение. Строки возвращаются как есть, поэтому
+работают и кортежи, и sqlite3.Row. Все записи яйценоскости увеличивают
+версию данных пользователя, по которой приложения сбрасывают свои кэши,
+и поправляют его итоги в user_activity и global_stats и состояние
+детектора отклонений (tenhens_core.anomalies).
+"""
+import logging
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from . import anomalies, metrics
+
+DB_NAME = "/app/data/egg_database.db"
+
+# Группировка дат по периодам для временных рядов
+SERIES_BUCKETS = {
+    'day': "date",
+    'week': "date(date, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m-01', date)"
+}
+
+# Начиная с какого периода графики строятся по неделям и по месяцам
+DOWNSAMPLE_WEEK_DAYS = 90
+DOWNSAMPLE_MONTH_DAYS = 730
+
+# Запросы дольше порога пишутся в лог tenhens_core.sql; 0 - писать все
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+
+# Сколько разных запросов запоминать для проверки планов
+STATEMENT_REGISTRY_SIZE = 1024
+
+logger = logging.getLogger('tenhens_core.sql')
+
+
+# ==================== INSTRUMENTATION ====================
+
+sql_query_seconds = metrics.registry.histogram(
+    'tenhens_sql_query_seconds', 'Время выполнения SQL-запроса до первой строки', ('statement',))
+sql_fetch_seconds = metrics.registry.counter(
+    'tenhens_sql_fetch_seconds_total', 'Время чтения строк результата', ('statement',))
+sql_rows = metrics.registry.counter(
+    'tenhens_sql_rows_total', 'Строк прочитано или изменено запросом', ('statement',))
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Текст запроса без литералов и лишних пробелов: метка для метрик"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', sql)
+    return ' '.join(sql.split())[:200]
+
+
+# Отпечаток -> (текст, параметры) первого выполнения каждого запроса.
+# По нему benchmarks/query_plans.py проверяет планы всех запросов приложений.
+statements = {}
+
+
+def register_statement(sql, parameters):
+    statement = fingerprint(sql)
+    if statement not in statements and len(statements) < STATEMENT_REGISTRY_SIZE:
+        statements[statement] = (sql, parameters)
+    return statement
+
+
+def parameter_shape(parameters):
+    """Типы параметров без значений: в лог не попадают пароли и заметки"""
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in parameters.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in parameters) + ')'
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор, который записывает время и число строк каждого запроса.
+
+    Строки считаются в fetchone/fetchmany/fetchall; при обходе курсора
+    в цикле учитывается только время выполнения.
+    """
+    statement = None
+
+    def _timed(self, method, sql, parameters, shape):
+        started = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            sql_query_seconds.observe(elapsed, statement=self.statement)
+            if self.rowcount > 0:
+                sql_rows.inc(self.rowcount, statement=self.statement)
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                logger.warning('Медленный запрос %.1f мс: %s параметры %s',
+                               elapsed * 1000, self.statement, shape())
+
+    def execute(self, sql, parameters=()):
+        self.statement = register_statement(sql, parameters)
+        return self._timed(super().execute, sql, parameters, lambda: parameter_shape(parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        # Последовательность может быть генератором: в реестр попадает только текст
+        if isinstance(seq_of_parameters, (list, tuple)):
+            self.statement = register_statement(sql, seq_of_parameters[0] if seq_of_parameters else ())
+            shape = lambda: f'{len(seq_of_parameters)} x {parameter_shape(seq_of_parameters[0]) if seq_of_parameters else "()"}'
+        else:
+            self.statement = register_statement(sql, None)
+            shape = lambda: 'пакет'
+        return self._timed(super().executemany, sql, seq_of_parameters, shape)
+
+    def _fetched(self, started, rows):
+        if self.statement is not None:
+            sql_fetch_seconds.inc(time.perf_counter() - started, statement=self.statement)
+            if rows:
+                sql_rows.inc(rows, statement=self.statement)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+
+class TimedConnection(sqlite3.Connection):
+    """Соединение, все запросы которого идут через TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(db_name=DB_NAME, row_factory=None, **kwargs):
+    kwargs.setdefault('factory', TimedConnection)
+    conn = sqlite3.connect(db_name, **kwargs)
+    if row_factory:
+        conn.row_factory = row_factory
+    return conn
+
+
+def init_schema(conn):
+    """Общие таблицы: записи о яйценоскости, версии данных, итоги и модели прогноза.
+
+    В отличие от остальных функций сама фиксирует первое заполнение итогов.
+    """
+    # WAL позволяет читать из нескольких процессов параллельно с записью
+    conn.execute('PRAGMA journal_mode=WAL')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS eggs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER,
+                     date TEXT,
+                     count INTEGER,
+                     notes TEXT)''')
+    # Все запросы к eggs фильтруют по пользователю и периоду; count в индексе
+    # позволяет считать суммы по дням, не читая строки таблицы
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_eggs_user_date ON eggs (user_id, date, count)')
+
+    # Версии данных пользователей для инвалидации кэшей во всех приложениях
+    conn.execute('''CREATE TABLE IF NOT EXISTS data_versions
+                    (user_id INTEGER PRIMARY KEY,
+                     version INTEGER NOT NULL DEFAULT 0)''')
+
+    # Итоги по пользователям и по всему сервису для панели администратора.
+    # Обновляются при каждой записи, поэтому сводка не читает eggs целиком.
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_activity
+                    (user_id INTEGER PRIMARY KEY,
+                     entries INTEGER NOT NULL,
+                     total_eggs INTEGER NOT NULL,
+                     last_active_date TEXT)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_activity_entries ON user_activity (entries, user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_activity_last_active ON user_activity (last_active_date)')
+    conn.execute('''CREATE TABLE IF NOT EXISTS global_stats
+                    (id INTEGER PRIMARY KEY CHECK (id = 1),
+                     total_users INTEGER NOT NULL,
+                     total_records INTEGER NOT NULL,
+                     total_eggs INTEGER NOT NULL)''')
+    if conn.execute('SELECT 1 FROM global_stats').fetchone() is None:
+        rebuild_activity(conn)
+        # Заполнение итогов открывает транзакцию; схема не должна оставлять её
+        # открытой, иначе вызывающий не сможет сменить PRAGMA (synchronous и т.п.)
+        getattr(conn, 'connection', conn).commit()
+
+    # Подогнанные модели прогноза (tenhens_core.forecast), JSON с параметрами и состоянием
+    conn.execute('''CREATE TABLE IF NOT EXISTS forecast_models
+                    (user_id INTEGER PRIMARY KEY,
+                     version INTEGER NOT NULL,
+                     model TEXT NOT NULL)''')
+
+    # Среднее и дисперсия дневных сумм за окно перед последним днём (tenhens_core.anomalies)
+    conn.execute('''CREATE TABLE IF NOT EXISTS anomaly_state
+                    (user_id INTEGER PRIMARY KEY,
+                     days INTEGER NOT NULL,
+                     mean REAL NOT NULL,
+                     m2 REAL NOT NULL,
+                     open_date TEXT)''')
+    # Очередь оповещений об отклонениях; бот отправляет неотправленные
+    conn.execute('''CREATE TABLE IF NOT EXISTS anomaly_alerts
+                    (user_id INTEGER NOT NULL,
+                     date TEXT NOT NULL,
+                     total INTEGER NOT NULL,
+                     mean REAL NOT NULL,
+                     std REAL NOT NULL,
+                     z REAL NOT NULL,
+                     created_at TEXT NOT NULL,
+                     sent_at TEXT,
+                     PRIMARY KEY (user_id, date))''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_anomaly_alerts_pending
+                    ON anomaly_alerts (created_at) WHERE sent_at IS NULL''')
+
+
+def period_start(days):
+    """Первая дата периода из days дней, включая сегодняшний"""
+    return (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
+
+
+def pick_resolution(days):
+    """Шаг графика по длине периода"""
+    if days > DOWNSAMPLE_MONTH_DAYS:
+        return 'month'
+    if days > DOWNSAMPLE_WEEK_DAYS:
+        return 'week'
+    return 'day'
+
+# ==================== DATA VERSIONS ====================
+
+def get_data_version(conn, user_id):
+    row = conn.execute('SELECT version FROM data_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(conn, user_id):
+    conn.execute(
+        '''INSERT INTO data_versions (user_id, version) VALUES (?, 1)
+           ON CONFLICT(user_id) DO UPDATE SET version = version + 1''',
+        (user_id,)
+    )
+
+# ==================== ACTIVITY ====================
+
+def rebuild_activity(conn):
+    """Пересчитать user_activity и global_stats по всей таблице eggs (миграция, массовая загрузка)"""
+    conn.execute('DELETE FROM user_activity')
+    conn.execute(
+        '''INSERT INTO user_activity (user_id, entries, total_eggs, last_active_date)
+           SELECT user_id, COUNT(*), COALESCE(SUM(count), 0), MAX(date)
+           FROM eggs
+           WHERE user_id IS NOT NULL
+           GROUP BY user_id'''
+    )
+    conn.execute(
+        '''INSERT OR REPLACE INTO global_stats (id, total_users, total_records, total_eggs)
+           SELECT 1, COUNT(*), COALESCE(SUM(entries), 0), COALESCE(SUM(total_eggs), 0)
+           FROM user_activity'''
+    )
+
+
+def apply_activity_delta(conn, user_id, entries=0, eggs=0, added_dates=(), removed_dates=()):
+    """Поправить итоги пользователя и общие итоги на изменение записей.
+
+    entries и eggs - изменение числа записей и суммы яиц, added_dates и
+    removed_dates - даты появившихся и исчезнувших записей. История
+    пользователя не перечитывается: MAX(date) ищется по индексу, только
+    если исчезла запись последнего дня. Вызывается в той же транзакции,
+    что и изменение eggs.
+    """
+    old = conn.execute(
+        'SELECT entries, total_eggs, last_active_date FROM user_activity WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    old_entries, old_eggs, last_active_date = old if old else (0, 0, None)
+    new_entries = old_entries + entries
+
+    if new_entries > 0:
+        if last_active_date is not None and any(day is not None and day >= last_active_date for day in removed_dates):
+            last_active_date = conn.execute(
+                'SELECT MAX(date) FROM eggs WHERE user_id = ?', (user_id,)
+            ).fetchone()[0]
+        elif added_dates:
+            last_active_date = max(filter(None, (last_active_date, *added_dates)), default=None)
+        conn.execute(
+            '''INSERT OR REPLACE INTO user_activity (user_id, entries, total_eggs, last_active_date)
+               VALUES (?, ?, ?, ?)''',
+            (user_id, new_entries, old_eggs + eggs, last_active_date)
+        )
+    elif old:
+        conn.execute('DELETE FROM user_activity WHERE user_id = ?', (user_id,))
+
+    conn.execute(
+        '''UPDATE global_stats
+           SET total_users = total_users + ?,
+               total_records = total_records + ?,
+               total_eggs = total_eggs + ?
+           WHERE id = 1''',
+        ((new_entries > 0) - (old_entries > 0), entries, eggs)
+    )
+
+
+def refresh_user_activity(conn, user_id):
+    """Пересчитать итоги пользователя по всем его записям (починка разошедшихся итогов).
+
+    Общие итоги поправляются на разницу со старыми итогами пользователя.
+    """
+    entries, total_eggs, last_active_date = conn.execute(
+        'SELECT COUNT(*), COALESCE(SUM(count), 0), MAX(date) FROM eggs WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    old = conn.execute(
+        'SELECT entries, total_eggs FROM user_activity WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    old_entries, old_eggs = old if old else (0, 0)
+
+    if entries:
+        conn.execute(
+            '''INSERT OR REPLACE INTO user_activity (user_id, entries, total_eggs, last_active_date)
+               VALUES (?, ?, ?, ?)''',
+            (user_id, entries, total_eggs, last_active_date)
+        )
+    elif old:
+        conn.execute('DELETE FROM user_activity WHERE user_id = ?', (user_id,))
+
+    conn.execute(
+        '''UPDATE global_stats
+           SET total_users = total_users + ?,
+               total_records = total_records + ?,
+               total_eggs = total_eggs + ?
+           WHERE id = 1''',
+        ((entries > 0) - (old_entries > 0), entries - old_entries, total_eggs - old_eggs)
+    )
+
+
+def query_global_stats(conn, active_days=7):
+    """Сводка по сервису: пользователи, записи, яйца и активные за active_days дней"""
+    row = conn.execute('SELECT total_users, total_records, total_eggs FROM global_stats WHERE id = 1').fetchone()
+    total_users, total_records, total_eggs = row if row else (0, 0, 0)
+    active_users = conn.execute(
+        'SELECT COUNT(*) FROM user_activity WHERE last_active_date >= ?',
+        (period_start(active_days),)
+    ).fetchone()[0]
+    return {
+        'total_users': total_users,
+        'total_records': total_records,
+        'total_eggs': total_eggs,
+        'active_users': active_users
+    }
+
+
+# Сортировки списка пользователей: колонка user_activity с индексом
+USER_ACTIVITY_ORDERS = {
+    'entries': 'entries',
+    'recent': 'last_active_date',
+}
+
+
+def query_user_activity_page(conn, order='entries', cursor=None, backward=False, limit=20):
+    """Страница пользователей по убыванию order: (rows, has_more).
+
+    rows - (user_id, entries, last_active_date). cursor - (ключ, user_id)
+    последней строки предыдущей страницы или, при backward, первой строки
+    следующей. has_more - есть ли строки дальше в направлении обхода.
+    Читается не больше limit + 1 строк индекса, без OFFSET и сортировки.
+    """
+    column = USER_ACTIVITY_ORDERS[order]
+    query = "SELECT user_id, entries, last_active_date FROM user_activity"
+    params = []
+    if cursor is not None:
+        query += f" WHERE ({column}, user_id) {'>' if backward else '<'} (?, ?)"
+        params.extend(cursor)
+    direction = 'ASC' if backward else 'DESC'
+    query += f" ORDER BY {column} {direction}, user_id {direction} LIMIT ?"
+    params.append(limit + 1)
+
+    rows = conn.execute(query, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    return rows, has_more
+
+# ==================== RECORDS ====================
+
+def check_count(count):
+    """ValueError, если количество не целое число: NULL и строки ломают суммы"""
+    if not isinstance(count, int) or isinstance(count, bool):
+        raise ValueError('Количество должно быть целым числом')
+
+
+def add_record(conn, user_id, date, count, notes=""):
+    """Добавить запись, возвращает её id"""
+    check_count(count)
+    before = anomalies.day_totals(conn, user_id, [date])
+    cursor = conn.execute(
+        "INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, ?, ?)",
+        (user_id, date, count, notes)
+    )
+    record_id = cursor.lastrowid
+    bump_data_version(conn, user_id)
+    apply_activity_delta(conn, user_id, 1, count or 0, added_dates=[date])
+    anomalies.observe(conn, user_id, before)
+    return record_id
+
+
+def add_records(conn, user_id, records):
+    """Добавить несколько записей (date, count, notes) одним запросом, возвращает их число"""
+    for _, count, _ in records:
+        check_count(count)
+    before = anomalies.day_totals(conn, user_id, [date for date, _, _ in records])
+    conn.executemany(
+        "INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, ?, ?)",
+        [(user_id, date, count, notes) for date, count, notes in records]
+    )
+    bump_data_version(conn, user_id)
+    apply_activity_delta(
+        conn, user_id, len(records), sum(count or 0 for _, count, _ in records),
+        added_dates=[date for date, _, _ in records]
+    )
+    anomalies.observe(conn, user_id, before)
+    return len(records)
+
+
+def get_record(conn, record_id, user_id):
+    """Запись (id, user_id, date, count, notes), если она принадлежит пользователю"""
+    return conn.execute(
+        "SELECT id, user_id, date, count, notes FROM eggs WHERE id = ? AND user_id = ?",
+        (record_id, user_id)
+    ).fetchone()
+
+
+def update_record(conn, record_id, user_id, count=None, date=None, notes=None):
+    """Обновить переданные поля записи пользователя, возвращает True, если запись найдена"""
+    updates = []
+    params = []
+    if count is not None:
+        check_count(count)
+        updates.append("count = ?")
+        params.append(count)
+    if date is not None:
+        updates.append("date = ?")
+        params.append(date)
+    if notes is not None:
+        updates.append("notes = ?")
+        params.append(notes)
+
+    if not updates:
+        return get_record(conn, record_id, user_id) is not None
+
+    # Старая запись и суммы затронутых дней до изменения - для итогов и детектора отклонений
+    before = None
+    if count is not None or date is not None:
+        old = get_record(conn, record_id, user_id)
+        if old is None:
+            return False
+        before = anomalies.day_totals(conn, user_id, [old[2], date or old[2]])
+
+    params.extend([record_id, user_id])
+    cursor = conn.execute(f"UPDATE eggs SET {', '.join(updates)} WHERE id = ? AND user_id = ?", params)
+    if cursor.rowcount == 0:
+        return False
+    bump_data_version(conn, user_id)
+    if before is not None:
+        apply_activity_delta(
+            conn, user_id, 0, (old[3] if count is None else count) - (old[3] or 0),
+            added_dates=[date or old[2]], removed_dates=[old[2]] if date not in (None, old[2]) else []
+        )
+        anomalies.observe(conn, user_id, before)
+    return True
+
+
+def delete_record(conn, record_id, user_id):
+    """Удалить запись пользователя, возвращает True, если запись найдена"""
+    old = get_record(conn, record_id, user_id)
+    if old is None:
+        return False
+    before = anomalies.day_totals(conn, user_id, [old[2]])
+    conn.execute("DELETE FROM eggs WHERE id = ? AND user_id = ?", (record_id, user_id))
+    bump_data_version(conn, user_id)
+    apply_activity_delta(conn, user_id, -1, -(old[3] or 0), removed_dates=[old[2]])
+    anomalies.observe(conn, user_id, before)
+    return True
+
+
+def query_record_values(conn, user_id, record_ids):
+    """Даты и количества записей пользователя с указанными id: {id: (date, count)}"""
+    if not record_ids:
+        return {}
+    placeholders = ', '.join('?' * len(record_ids))
+    return {row[0]: (row[1], row[2]) for row in conn.execute(
+        f"SELECT id, date, count FROM eggs WHERE user_id = ? AND id IN ({placeholders})",
+        [user_id] + list(record_ids)
+    ).fetchall()}
+
+
+def apply_record_changes(conn, user_id, updates=(), deleted_ids=()):
+    """Изменить и удалить несколько записей пользователя (правки таблицы в Streamlit).
+
+    updates - (date, count, notes, id), deleted_ids - id; чужие записи
+    не затрагиваются. Возвращает число изменённых и удалённых записей.
+    """
+    if not updates and not deleted_ids:
+        return 0
+    for _, count, _, _ in updates:
+        check_count(count)
+    # Старые значения записей и суммы затронутых дней - для итогов и детектора отклонений
+    old = query_record_values(conn, user_id, list({row[3] for row in updates} | set(deleted_ids)))
+    before = anomalies.day_totals(conn, user_id, [day for day, _ in old.values()] + [row[0] for row in updates])
+    changed = 0
+    if updates:
+        changed += conn.executemany(
+            "UPDATE eggs SET date = ?, count = ?, notes = ? WHERE id = ? AND user_id = ?",
+            [tuple(row) + (user_id,) for row in updates]
+        ).rowcount
+    if deleted_ids:
+        changed += conn.executemany(
+            "DELETE FROM eggs WHERE id = ? AND user_id = ?",
+            [(record_id, user_id) for record_id in deleted_ids]
+        ).rowcount
+    if changed:
+        # Правки применяются по порядку: сначала изменения, затем удаления
+        new = dict(old)
+        for day, count, _, record_id in updates:
+            if record_id in new:
+                new[record_id] = (day, count)
+        for record_id in deleted_ids:
+            new.pop(record_id, None)
+        bump_data_version(conn, user_id)
+        apply_activity_delta(
+            conn, user_id, len(new) - len(old),
+            sum(count or 0 for _, count in new.values()) - sum(count or 0 for _, count in old.values()),
+            added_dates=[day for day, _ in new.values()],
+            removed_dates=[day for record_id, (day, _) in old.items() if new.get(record_id, (None,))[0] != day]
+        )
+        anomalies.observe(conn, user_id, before)
+    return changed
+
+
+def query_records(conn, user_id, min_date=None, max_date=None, search_notes=''):
+    """Записи пользователя от новых к старым в виде словарей"""
+    query = "SELECT id, date, count, notes FROM eggs WHERE user_id = ?"
+    params = [user_id]
+
+    if min_date:
+        query += " AND date >= ?"
+        params.append(min_date)
+    if max_date:
+        query += " AND date <= ?"
+        params.append(max_date)
+
+    query += " ORDER BY date DESC, id DESC"
+
+    records = conn.execute(query, params).fetchall()
+
+    # Фильтрация по заметкам на стороне Python: LOWER в SQLite не знает кириллицу
+    if search_notes:
+        needle = search_notes.lower()
+        records = [r for r in records if needle in (r[3] or '').lower()]
+
+    return [{'id': r[0], 'date': r[1], 'count': r[2], 'notes': r[3]} for r in records]
+
+# ==================== AGGREGATES ====================
+
+def query_daily_totals(conn, user_id, days):
+    """Суммы по дням за период: (date, total)"""
+    return conn.execute(
+        '''SELECT date, SUM(count) as total
+           FROM eggs
+           WHERE user_id = ? AND date >= ?
+           GROUP BY date
+           ORDER BY date''',
+        (user_id, period_start(days))
+    ).fetchall()
+
+
+def query_summary(conn, user_id):
+    total_eggs, records_count = conn.execute(
+        'SELECT SUM(count), COUNT(*) FROM eggs WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    total_eggs = total_eggs or 0
+
+    return {
+        'total_eggs': total_eggs,
+        'records_count': records_count,
+        'avg_per_record': total_eggs / records_count if records_count > 0 else 0
+    }
+
+
+def query_all_records(conn, user_id):
+    """Все записи пользователя по возрастанию даты, за один день - в порядке добавления: (date, count, notes)"""
+    return conn.execute(
+        '''SELECT date, count, notes FROM eggs
+           WHERE user_id = ?
+           ORDER BY date, id''',
+        (user_id,)
+    ).fetchall()
+
+
+def query_plot_points(conn, user_id, days):
+    """Точки графика: суммы по дням за период, либо последние записи, если за период пусто"""
+    data = query_daily_totals(conn, user_id, days)
+    if data:
+        return [row[0] for row in data], [row[1] for row in data]
+
+    recent_data = query_all_records(conn, user_id)[-days:]
+    return [row[0] for row in recent_data], [row[1] for row in recent_data]
+
+
+def query_series(conn, user_id, days, resolution='day'):
+    """Суммы по дням, агрегированные в периоды: (bucket, total, mean, low, high)"""
+    bucket = SERIES_BUCKETS[resolution]
+    return conn.execute(
+        f'''SELECT {bucket} as bucket,
+                   SUM(total) as total,
+                   AVG(total) as mean,
+                   MIN(total) as low,
+                   MAX(total) as high
+            FROM (SELECT date, SUM(count) as total
+                  FROM eggs
+                  WHERE user_id = ? AND date >= ?
+                  GROUP BY date)
+            GROUP BY bucket
+            ORDER BY bucket''',
+        (user_id, period_start(days))
+    ).fetchall()
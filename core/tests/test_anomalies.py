@@ -0,0 +1,45 @@
+"""Детектор отклонений на записях без количества"""
+import pytest
+
+from tenhens_core import anomalies, storage
+
+USER_ID = 1
+
+
+@pytest.fixture
+def conn():
+    conn = storage.connect(':memory:')
+    storage.init_schema(conn)
+    yield conn
+    conn.close()
+
+
+def test_days_with_null_counts_count_as_zero(conn):
+    # Старые данные: записи без количества, вставленные в обход storage
+    conn.executemany(
+        'INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, NULL, ?)',
+        [(USER_ID, f'2026-01-{day:02d}', '') for day in range(1, 11)]
+    )
+    storage.rebuild_activity(conn)
+
+    assert anomalies.day_totals(conn, USER_ID, ['2026-01-05', '2026-01-20']) == {'2026-01-05': 0, '2026-01-20': None}
+    storage.add_record(conn, USER_ID, '2026-01-11', 5)
+    storage.update_record(conn, storage.add_record(conn, USER_ID, '2026-01-12', 3), USER_ID, count=4)
+
+    state = anomalies.load_state(conn, USER_ID)
+    assert state == anomalies.rebuild_state(conn, USER_ID, '2026-01-12')
+    assert state['days'] == 11
+
+
+@pytest.mark.parametrize('count', [None, '5', 2.5, True])
+def test_add_record_rejects_non_integer_count(conn, count):
+    with pytest.raises(ValueError):
+        storage.add_record(conn, USER_ID, '2026-01-01', count)
+    assert conn.execute('SELECT COUNT(*) FROM eggs').fetchone()[0] == 0
+
+
+def test_update_record_rejects_non_integer_count(conn):
+    record_id = storage.add_record(conn, USER_ID, '2026-01-01', 3)
+    with pytest.raises(ValueError):
+        storage.update_record(conn, record_id, USER_ID, count='7')
+    assert storage.get_record(conn, record_id, USER_ID)[3] == 3
@@ -0,0 +1,40 @@
+"""Объединение метрик воркеров gunicorn"""
+import json
+
+from tenhens_core import metrics
+
+
+def worker_snapshot(hit_rate, ttl, hits):
+    registry = metrics.Registry()
+    gauge = registry.gauge('tenhens_cache', 'Состояние кэшей процесса', ('cache', 'field'))
+    counter = registry.counter('tenhens_cache_hits_total', 'Попадания в кэш', ('cache',))
+    gauge.set(hit_rate, cache='response', field='hit_rate')
+    gauge.set(ttl, cache='response', field='ttl')
+    counter.inc(hits, cache='response')
+    return registry.snapshot()
+
+
+def test_merge_sums_counters_but_not_gauges():
+    merged = metrics.merge_snapshots([worker_snapshot(0.9, 300, 5) for _ in range(4)])
+    gauges = dict((tuple(key), value) for key, value in merged['tenhens_cache']['values'])
+    assert gauges == {('response', 'hit_rate'): 0.9, ('response', 'ttl'): 300}
+    assert merged['tenhens_cache_hits_total']['values'] == [[['response'], 20]]
+
+
+def test_merge_takes_max_of_different_gauges():
+    merged = metrics.merge_snapshots([worker_snapshot(rate, 300, 1) for rate in (0.5, 0.9, 0.7)])
+    gauges = dict((tuple(key), value) for key, value in merged['tenhens_cache']['values'])
+    assert gauges[('response', 'hit_rate')] == 0.9
+
+
+def test_render_labels_gauges_with_pid(tmp_path, monkeypatch):
+    for pid, rate in ((101, 0.5), (102, 0.9)):
+        (tmp_path / f'{pid}.json').write_text(json.dumps(worker_snapshot(rate, 300, 5)))
+    monkeypatch.setattr(metrics, 'multiprocess_dir', str(tmp_path))
+    monkeypatch.setattr(metrics, 'registry', metrics.Registry())
+
+    text = metrics.render()
+    assert 'tenhens_cache{cache="response",field="hit_rate",pid="101"} 0.5' in text
+    assert 'tenhens_cache{cache="response",field="hit_rate",pid="102"} 0.9' in text
+    assert 'tenhens_cache{cache="response",field="ttl",pid="102"} 300' in text
+    assert 'tenhens_cache_hits_total{cache="response"} 10' in text
@@ -0,0 +1,95 @@
+import React from 'react';
+import { Box } from '@mui/material';
+
+const WIDTH = 1000;
+const HEIGHT = 400;
+const PADDING = { top: 20, right: 20, bottom: 60, left: 50 };
+
+// Восстанавливает значения из дельта-кодирования /api/series
+const deltaDecode = (values) => {
+  let acc = 0;
+  return values.map((v) => (acc += v));
+};
+
+const addDays = (isoDate, days) => {
+  const date = new Date(`${isoDate}T00:00:00Z`);
+  date.setUTCDate(date.getUTCDate() + days);
+  return date.toISOString().split('T')[0];
+};
+
+export const decodeSeries = (series) => {
+  const decode = series.encoding === 'delta' ? deltaDecode : (v) => v;
+  const offsets = decode(series.offsets);
+  // Для недель и месяцев линия строится по среднему в день, полоса - по min/max
+  if (series.means) {
+    const lows = decode(series.lows);
+    const highs = decode(series.highs);
+    return offsets.map((offset, i) => ({
+      date: addDays(series.start, offset),
+      offset,
+      count: series.means[i],
+      low: lows[i],
+      high: highs[i],
+    }));
+  }
+  const counts = decode(series.counts);
+  return offsets.map((offset, i) => ({ date: addDays(series.start, offset), offset, count: counts[i] }));
+};
+
+const EggChart = ({ points }) => {
+  if (!points || points.length === 0) return null;
+
+  const plotWidth = WIDTH - PADDING.left - PADDING.right;
+  const plotHeight = HEIGHT - PADDING.top - PADDING.bottom;
+  const maxOffset = points[points.length - 1].offset || 1;
+  const hasBand = points[0].high !== undefined;
+  const maxCount = Math.max(...points.map((p) => (hasBand ? p.high : p.count)), 1);
+
+  const x = (offset) => PADDING.left + (offset / maxOffset) * plotWidth;
+  const y = (count) => PADDING.top + plotHeight - (count / maxCount) * plotHeight;
+
+  const path = points.map((p) => `${x(p.offset)},${y(p.count)}`).join(' ');
+  const band = hasBand
+    ? [
+        ...points.map((p) => `${x(p.offset)},${y(p.high)}`),
+        ...points.slice().reverse().map((p) => `${x(p.offset)},${y(p.low)}`),
+      ].join(' ')
+    : null;
+  const labelStep = Math.max(1, Math.ceil(points.length / 10));
+  const yTicks = [0, 0.25, 0.5, 0.75, 1].map((f) => Math.round(maxCount * f));
+
+  return (
+    <Box sx={{ width: '100%', overflowX: 'auto' }}>
+      <svg viewBox={`0 0 ${WIDTH} ${HEIGHT}`} width="100%" role="img" aria-label="Egg production chart">
+        {yTicks.map((tick) => (
+          <g key={tick}>
+            <line x1={PADDING.left} x2={WIDTH - PADDING.right} y1={y(tick)} y2={y(tick)} stroke="#000" strokeOpacity="0.1" />
+            <text x={PADDING.left - 8} y={y(tick) + 4} fontSize="12" textAnchor="end">{tick}</text>
+          </g>
+        ))}
+        {band && <polygon points={band} fill="#ff6b6b" fillOpacity="0.2" stroke="none" />}
+        <polyline points={path} fill="none" stroke="#ff6b6b" strokeWidth="2" />
+        {points.map((p, i) => (
+          <g key={p.date}>
+            <circle cx={x(p.offset)} cy={y(p.count)} r="4" fill="#ff6b6b">
+              <title>{hasBand ? `${p.date}: ${p.count} (${p.low}–${p.high})` : `${p.date}: ${p.count}`}</title>
+            </circle>
+            {i % labelStep === 0 && (
+              <text
+                x={x(p.offset)}
+                y={HEIGHT - PADDING.bottom + 16}
+                fontSize="11"
+                textAnchor="end"
+                transform={`rotate(-45 ${x(p.offset)} ${HEIGHT - PADDING.bottom + 16})`}
+              >
+                {p.date}
+              </text>
+            )}
+          </g>
+        ))}
+      </svg>
+    </Box>
+  );
+};
+
+export default EggChart;
@@ -1,40 +1,50 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, Response, current_app, g, request, jsonify, make_response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from werkzeug.middleware.proxy_fix import ProxyFix
 import sqlite3
+import gzip
 import hashlib
+import hmac
+import mimetypes
 import os
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
 from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
-from scipy import stats
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 
-app = Flask(__name__, static_folder='frontend/build', static_url_path='')
-CORS(app)
+from tenhens_core import metrics, profiling, storage
+from tenhens_core.analytics import query_analytics
+from tenhens_core.forecast import MAX_HORIZON_DAYS, query_forecast
+from tenhens_core.rendering import query_chart, render_chart
+from tenhens_core.security import hash_password, verify_password, verify_missing_user
+from tenhens_core.storage import (
+    SERIES_BUCKETS, get_data_version, pick_resolution,
+    query_daily_totals, query_records, query_series, query_summary,
+)
 
-# Конфигурация JWT
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
-jwt = JWTManager(app)
+# Brotli необязателен: без него ответы сжимаются gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+bp = Blueprint('tenhens', __name__)
+jwt = JWTManager()
 
 # Настройки базы данных
 DB_NAME = "/app/data/egg_database.db"
 
+# Собранный React-фронтенд относительно каталога приложения
+FRONTEND_BUILD = os.getenv('FRONTEND_BUILD', 'frontend/build')
+
 def init_db():
     conn = sqlite3.connect(DB_NAME)
+    # Записи о яйценоскости и версии данных - общие для всех приложений
+    storage.init_schema(conn)
     c = conn.cursor()
     
-    # Таблица для записей о яйценоскости
-    c.execute('''CREATE TABLE IF NOT EXISTS eggs
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  date TEXT,
-                  count INTEGER,
-                  notes TEXT)''')
-                  
     # Таблица пользователей с простой регистрацией (без telegram_id)
     c.execute('''CREATE TABLE IF NOT EXISTS users
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -44,20 +54,438 @@ def init_db():
                   security_answer TEXT,
                   created_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
     
+    # Версия токенов (растёт при смене пароля) и блокировка аккаунта
+    user_columns = [row[1] for row in c.execute("PRAGMA table_info(users)")]
+    if 'token_version' not in user_columns:
+        c.execute("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0")
+    if 'disabled' not in user_columns:
+        c.execute("ALTER TABLE users ADD COLUMN disabled INTEGER NOT NULL DEFAULT 0")
+    
     conn.commit()
     conn.close()
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return storage.connect(DB_NAME, row_factory=sqlite3.Row)
+
+# ==================== RESPONSE CACHE ====================
+
+# Размер и время жизни кэша ответов read-only эндпоинтов
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', 300))
+# Суммарный размер закэшированных тел ответов в одном воркере: PNG графиков
+# в десятки раз больше JSON, и одного ограничения по числу записей мало
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+class LRUCache:
+    """Потокобезопасный LRU кэш с ограниченным размером и временем жизни записей.
+
+    Если задан max_bytes, размер значений (по функции sizeof) ограничен и
+    суммарно; значение больше всего бюджета не кэшируется.
+    """
+
+    def __init__(self, max_entries, ttl, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.bytes -= size
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes and self.sizeof else 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            if self.max_bytes and size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[2]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes or 0,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# Версия данных пользователя входит в ключ, поэтому после записи старые
+# ответы просто перестают находиться и вытесняются по LRU или TTL. Версии
+# хранятся в БД, чтобы запись в одном воркере gunicorn была видна всем.
+response_cache = LRUCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_MAX_BYTES,
+                          sizeof=lambda cached: len(cached[0]))
+
+def cached_response(view):
+    """Кэширует успешный ответ view по id пользователя и параметрам запроса"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = get_jwt_identity()['id']
+        conn = get_db_connection()
+        version = get_data_version(conn, user_id)
+        conn.close()
+        key = (
+            view.__name__,
+            user_id,
+            version,
+            tuple(sorted(request.args.items(multi=True)))
+        )
+        cached = response_cache.get(key)
+        if cached is not None:
+            body, status, headers = cached
+            return Response(body, status=status, headers=headers)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response_cache.set(key, (response.get_data(), response.status_code, list(response.headers)))
+        return response
+    return wrapper
+
+# ==================== METRICS ====================
+
+# Если задан, /metrics отдаётся только с заголовком Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+http_request_seconds = metrics.registry.histogram(
+    'tenhens_http_request_seconds', 'Время обработки HTTP-запроса', ('method', 'endpoint', 'status'))
+cache_gauge = metrics.registry.gauge(
+    'tenhens_cache', 'Состояние кэшей процесса', ('cache', 'field'))
+
+def collect_cache_stats():
+    # Вызывается перед каждым снятием значений, в том числе при сбросе в общий каталог
+    for name, cache in (('response', response_cache), ('user', user_cache)):
+        for field, value in cache.stats().items():
+            cache_gauge.set(value, cache=name, field=field)
+
+metrics.registry.add_collector(collect_cache_stats)
+
+@bp.before_app_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+# Зарегистрирован раньше сжатия, поэтому выполняется после него и учитывает его время
+@bp.after_app_request
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Шаблон маршрута, а не путь: /api/records/<int:record_id> - одна серия
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_seconds.observe(time.perf_counter() - started, method=request.method,
+                                     endpoint=endpoint, status=response.status_code)
+    return response
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                 f'Bearer {METRICS_TOKEN}'):
+        return jsonify({'error': 'Требуется авторизация'}), 401
+    # Под gunicorn - сумма по всем воркерам из METRICS_MULTIPROC_DIR
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# ==================== PROFILING ====================
+
+# Профилирование отдельного запроса для администратора: заголовок
+# X-Profile: <PROFILE_TOKEN> (или ?_profile=<PROFILE_TOKEN>). Без токена выключено.
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+# Куда сохранять дампы; ответ получает заголовок X-Profile-File
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/app/data/profiles')
+
+def profiling_requested():
+    token = request.headers.get('X-Profile') or request.args.get('_profile')
+    return token is not None and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+@bp.before_app_request
+def start_profiler():
+    if PROFILE_TOKEN and profiling_requested():
+        g.profiler = profiling.start()
+
+# Выполняется после сжатия, но до записи метрик
+@bp.after_app_request
+def stop_profiler(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+
+    # X-Profile-Output: prof - вернуть дамп вместо ответа, text - отчёт по функциям
+    output = request.headers.get('X-Profile-Output') or request.args.get('_profile_output', '')
+    if output == 'prof':
+        response = Response(profiling.dump_bytes(profiler), mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = 'attachment; filename=request.prof'
+    elif output == 'text':
+        response = Response(profiling.report(profiler), mimetype='text/plain')
+    else:
+        label = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+        path = profiling.save(profiler, PROFILE_DIR, label)
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@bp.teardown_app_request
+def discard_profiler(exc):
+    # Если обработка прервалась до after_request, профилировщик нужно выключить
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+# ==================== COMPRESSION AND ETAGS ====================
+
+# Ответы меньше порога не сжимаются: выигрыш не окупает заголовки и CPU
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'application/javascript', 'text/javascript', 'text/css',
+    'text/html', 'text/plain', 'image/svg+xml', 'application/manifest+json'
+)
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_body(body, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if best else 5)
+    return gzip.compress(body, compresslevel=9 if best else 6)
+
+@bp.after_app_request
+def compress_response(response):
+    if (not request.path.startswith('/api/')
+            or response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # У сжатого представления свой строгий ETag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+def not_modified(etag):
+    """Проверяет If-None-Match для тела с данным ETag с учётом сжатых вариантов"""
+    for suffix in ('', '-gzip', '-br'):
+        if request.if_none_match.contains(etag + suffix):
+            return etag + suffix
+    return None
+
+def etag_response(view):
+    """Строгий ETag по содержимому ответа и 304 Not Modified при совпадении"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return response
+        
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+        matched = not_modified(etag)
+        if matched:
+            response = Response(status=304)
+            etag = matched
+        response.set_etag(etag)
+        # Браузер хранит ответ, но каждый раз сверяет его с сервером
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+# ==================== AUTH USER CACHE ====================
+
+# Короткий TTL ограничивает время, за которое смена пароля в одном воркере
+# доходит до остальных; в своём воркере она применяется сразу
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 4096))
+USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', 30))
+
+user_cache = LRUCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+
+def load_auth_user(user_id):
+    """Состояние аккаунта для проверки токена: из кэша или одним запросом по PK"""
+    user = user_cache.get(user_id)
+    if user is None:
+        conn = get_db_connection()
+        row = conn.execute(
+            "SELECT id, token_version, disabled FROM users WHERE id = ?",
+            (user_id,)
+        ).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        user = dict(row)
+        user_cache.set(user_id, user)
+    return user
+
+@jwt.token_in_blocklist_loader
+def is_token_revoked(jwt_header, jwt_payload):
+    user = load_auth_user(jwt_payload['sub']['id'])
+    if user is None or user['disabled']:
+        return True
+    return jwt_payload.get('tv', 0) != user['token_version']
+
+# ==================== RATE LIMITING ====================
+
+# Скользящее окно попыток входа и восстановления пароля
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv('RATE_LIMIT_WINDOW_SECONDS', 60))
+RATE_LIMIT_PER_IP = int(os.getenv('RATE_LIMIT_PER_IP', 20))
+RATE_LIMIT_PER_USER = int(os.getenv('RATE_LIMIT_PER_USER', 5))
+
+class MemoryRateLimitStore:
+    """Окно в памяти процесса: быстро, но у каждого воркера gunicorn своё"""
+
+    # Как часто выбрасывать ключи, по которым давно не было попыток
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        self._hits = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def hit(self, key, limit, window):
+        """Учитывает попытку, возвращает (разрешено, через сколько секунд повторить)"""
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.SWEEP_EVERY == 0:
+                self._sweep(now, window)
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return False, hits[0] + window - now
+            hits.append(now)
+            return True, 0
+
+    def _sweep(self, now, window):
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - window]:
+            del self._hits[key]
+
+class SQLiteRateLimitStore:
+    """Общее окно для всех воркеров в той же базе SQLite"""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self._calls = 0
+        # Потоки gthread-воркера увеличивают счётчик одновременно
+        self._lock = threading.Lock()
+
+    def init_schema(self):
+        conn = storage.connect(self.db_name)
+        conn.execute('''CREATE TABLE IF NOT EXISTS rate_limit_hits
+                        (key TEXT NOT NULL,
+                         ts REAL NOT NULL)''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limit_hits_key_ts ON rate_limit_hits (key, ts)")
+        conn.commit()
+        conn.close()
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        with self._lock:
+            self._calls += 1
+            sweep = self._calls % self.SWEEP_EVERY == 0
+        conn = storage.connect(self.db_name, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if sweep:
+                conn.execute("DELETE FROM rate_limit_hits WHERE ts <= ?", (now - window,))
+            else:
+                conn.execute("DELETE FROM rate_limit_hits WHERE key = ? AND ts <= ?", (key, now - window))
+            count, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(ts) FROM rate_limit_hits WHERE key = ?", (key,)
+            ).fetchone()
+            if count >= limit:
+                conn.execute('COMMIT')
+                return False, oldest + window - now
+            conn.execute("INSERT INTO rate_limit_hits (key, ts) VALUES (?, ?)", (key, now))
+            conn.execute('COMMIT')
+            return True, 0
+        finally:
+            conn.close()
+
+def create_rate_limit_store(backend):
+    if backend == 'sqlite':
+        return SQLiteRateLimitStore(DB_NAME)
+    return MemoryRateLimitStore()
+
+rate_limit_store = create_rate_limit_store(RATE_LIMIT_BACKEND)
+
+def rate_limited(scope, per_ip=RATE_LIMIT_PER_IP, per_user=RATE_LIMIT_PER_USER, window=RATE_LIMIT_WINDOW_SECONDS):
+    """Отклоняет запрос с 429 до обращения к БД, если превышен лимит по IP или по имени пользователя"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True) or {}
+            username = str(data.get('username', '')).strip().lower()
+            checks = [(f'{scope}:ip:{request.remote_addr}', per_ip)]
+            if username:
+                checks.append((f'{scope}:user:{username}', per_user))
+            for key, limit in checks:
+                allowed, retry_after = rate_limit_store.hit(key, limit, window)
+                if not allowed:
+                    return (
+                        jsonify({'error': 'Слишком много попыток. Попробуйте позже'}),
+                        429,
+                        {'Retry-After': str(int(retry_after) + 1)}
+                    )
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
 
 # ==================== AUTH ENDPOINTS ====================
 
-@app.route('/api/auth/register', methods=['POST'])
+@bp.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.json
     username = data.get('username', '').strip()
@@ -86,7 +514,8 @@ def register():
     finally:
         conn.close()
 
-@app.route('/api/auth/login', methods=['POST'])
+@bp.route('/api/auth/login', methods=['POST'])
+@rate_limited('login')
 def login():
     data = request.json
     username = data.get('username', '').strip()
@@ -97,13 +526,26 @@ def login():
     
     conn = get_db_connection()
     user = conn.execute(
-        "SELECT id, username, password FROM users WHERE username = ?",
+        "SELECT id, username, password, token_version FROM users WHERE username = ?",
         (username,)
     ).fetchone()
+    
+    if user:
+        ok, needs_rehash = verify_password(password, user['password'])
+    else:
+        ok, needs_rehash = verify_missing_user(password)
+    
+    # Прозрачная миграция старых хэшей и хэшей с устаревшей стоимостью
+    if needs_rehash:
+        conn.execute("UPDATE users SET password = ? WHERE id = ?", (hash_password(password), user['id']))
+        conn.commit()
     conn.close()
     
-    if user and hash_password(password) == user['password']:
-        access_token = create_access_token(identity={'id': user['id'], 'username': user['username']})
+    if ok:
+        access_token = create_access_token(
+            identity={'id': user['id'], 'username': user['username']},
+            additional_claims={'tv': user['token_version']}
+        )
         return jsonify({
             'access_token': access_token,
             'user': {'id': user['id'], 'username': user['username']}
@@ -111,13 +553,14 @@ def login():
     
     return jsonify({'error': 'Неверные учетные данные'}), 401
 
-@app.route('/api/auth/me', methods=['GET'])
+@bp.route('/api/auth/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     current_user = get_jwt_identity()
     return jsonify({'user': current_user}), 200
 
-@app.route('/api/auth/recovery-question', methods=['POST'])
+@bp.route('/api/auth/recovery-question', methods=['POST'])
+@rate_limited('recovery')
 def get_recovery_question():
     data = request.json
     username = data.get('username', '').strip()
@@ -133,7 +576,8 @@ def get_recovery_question():
         return jsonify({'security_question': user['security_question']}), 200
     return jsonify({'error': 'Пользователь не найден'}), 404
 
-@app.route('/api/auth/reset-password', methods=['POST'])
+@bp.route('/api/auth/reset-password', methods=['POST'])
+@rate_limited('reset')
 def reset_password():
     data = request.json
     username = data.get('username', '').strip()
@@ -152,11 +596,24 @@ def reset_password():
         (username,)
     ).fetchone()
     
-    if user and hash_password(security_answer) == user['security_answer']:
+    if user:
+        ok, answer_needs_rehash = verify_password(security_answer, user['security_answer'])
+    else:
+        ok, answer_needs_rehash = verify_missing_user(security_answer)
+    
+    if ok:
         hashed_password = hash_password(new_password)
-        conn.execute("UPDATE users SET password = ? WHERE username = ?", (hashed_password, username))
+        # Новая версия токенов отзывает все ранее выданные токены
+        conn.execute(
+            "UPDATE users SET password = ?, token_version = token_version + 1 WHERE username = ?",
+            (hashed_password, username)
+        )
+        if answer_needs_rehash:
+            conn.execute("UPDATE users SET security_answer = ? WHERE username = ?",
+                         (hash_password(security_answer), username))
         conn.commit()
         conn.close()
+        user_cache.invalidate(user['id'])
         return jsonify({'message': 'Пароль успешно изменен!'}), 200
     
     conn.close()
@@ -164,8 +621,9 @@ def reset_password():
 
 # ==================== EGG RECORDS ENDPOINTS ====================
 
-@app.route('/api/records', methods=['GET'])
+@bp.route('/api/records', methods=['GET'])
 @jwt_required()
+@etag_response
 def get_records():
     current_user = get_jwt_identity()
     user_id = current_user['id']
@@ -176,31 +634,14 @@ def get_records():
     search_notes = request.args.get('search_notes', '')
     
     conn = get_db_connection()
-    
-    query = "SELECT id, date, count, notes FROM eggs WHERE user_id = ?"
-    params = [user_id]
-    
-    if min_date:
-        query += " AND date >= ?"
-        params.append(min_date)
-    if max_date:
-        query += " AND date <= ?"
-        params.append(max_date)
-    
-    query += " ORDER BY date DESC, id DESC"
-    
-    records = conn.execute(query, params).fetchall()
+    records = query_records(conn, user_id, min_date, max_date, search_notes)
     conn.close()
     
-    # Фильтрация по заметкам на стороне Python
-    if search_notes:
-        records = [r for r in records if search_notes.lower() in (r['notes'] or '').lower()]
-    
     return jsonify({
-        'records': [dict(r) for r in records]
+        'records': records
     }), 200
 
-@app.route('/api/records', methods=['POST'])
+@bp.route('/api/records', methods=['POST'])
 @jwt_required()
 def add_record():
     current_user = get_jwt_identity()
@@ -215,12 +656,12 @@ def add_record():
         return jsonify({'error': 'Дата обязательна'}), 400
     
     conn = get_db_connection()
-    cursor = conn.execute(
-        "INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, ?, ?)",
-        (user_id, date, count, notes)
-    )
+    try:
+        record_id = storage.add_record(conn, user_id, date, count, notes)
+    except ValueError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 400
     conn.commit()
-    record_id = cursor.lastrowid
     conn.close()
     
     return jsonify({
@@ -228,7 +669,7 @@ def add_record():
         'record': {'id': record_id, 'date': date, 'count': count, 'notes': notes}
     }), 201
 
-@app.route('/api/records/<int:record_id>', methods=['PUT'])
+@bp.route('/api/records/<int:record_id>', methods=['PUT'])
 @jwt_required()
 def update_record(record_id):
     current_user = get_jwt_identity()
@@ -236,245 +677,311 @@ def update_record(record_id):
     data = request.json
     
     conn = get_db_connection()
-    record = conn.execute(
-        "SELECT * FROM eggs WHERE id = ? AND user_id = ?",
-        (record_id, user_id)
-    ).fetchone()
-    
-    if not record:
+    try:
+        found = storage.update_record(conn, record_id, user_id,
+                                      count=data.get('count'), date=data.get('date'), notes=data.get('notes'))
+    except ValueError as e:
         conn.close()
-        return jsonify({'error': 'Запись не найдена'}), 404
+        return jsonify({'error': str(e)}), 400
+    conn.commit()
+    conn.close()
     
-    updates = []
-    params = []
-    
-    if 'count' in data:
-        updates.append("count = ?")
-        params.append(data['count'])
-    if 'date' in data:
-        updates.append("date = ?")
-        params.append(data['date'])
-    if 'notes' in data:
-        updates.append("notes = ?")
-        params.append(data['notes'])
-    
-    if updates:
-        query = f"UPDATE eggs SET {', '.join(updates)} WHERE id = ?"
-        params.append(record_id)
-        conn.execute(query, params)
-        conn.commit()
+    if not found:
+        return jsonify({'error': 'Запись не найдена'}), 404
     
-    conn.close()
     return jsonify({'message': 'Запись успешно обновлена!'}), 200
 
-@app.route('/api/records/<int:record_id>', methods=['DELETE'])
+@bp.route('/api/records/<int:record_id>', methods=['DELETE'])
 @jwt_required()
 def delete_record(record_id):
     current_user = get_jwt_identity()
     user_id = current_user['id']
     
     conn = get_db_connection()
-    record = conn.execute(
-        "SELECT * FROM eggs WHERE id = ? AND user_id = ?",
-        (record_id, user_id)
-    ).fetchone()
-    
-    if not record:
-        conn.close()
-        return jsonify({'error': 'Запись не найдена'}), 404
-    
-    conn.execute("DELETE FROM eggs WHERE id = ?", (record_id,))
+    found = storage.delete_record(conn, record_id, user_id)
     conn.commit()
     conn.close()
     
+    if not found:
+        return jsonify({'error': 'Запись не найдена'}), 404
+    
     return jsonify({'message': 'Запись успешно удалена!'}), 200
 
 # ==================== STATISTICS ENDPOINTS ====================
 
-@app.route('/api/stats', methods=['GET'])
+def delta_encode(values):
+    return values[:1] + [b - a for a, b in zip(values, values[1:])]
+
+def build_series(data, resolution, delta=False):
+    """Компактный ряд из строк query_series: не больше точек, чем периодов resolution"""
+    if not data:
+        return None
+    
+    # Даты передаются смещением в днях от первой точки
+    start = datetime.strptime(data[0]['bucket'], "%Y-%m-%d")
+    offsets = [(datetime.strptime(row['bucket'], "%Y-%m-%d") - start).days for row in data]
+    counts = [row['total'] for row in data]
+    series = {
+        'start': data[0]['bucket'],
+        'resolution': resolution,
+        'encoding': 'delta' if delta else 'plain'
+    }
+    
+    # Для недель и месяцев добавляем среднее за день и полосу min/max
+    if resolution != 'day':
+        lows = [row['low'] for row in data]
+        highs = [row['high'] for row in data]
+        series['means'] = [round(row['mean'], 2) for row in data]
+        series['lows'] = delta_encode(lows) if delta else lows
+        series['highs'] = delta_encode(highs) if delta else highs
+    
+    series['offsets'] = delta_encode(offsets) if delta else offsets
+    series['counts'] = delta_encode(counts) if delta else counts
+    return series
+
+@bp.route('/api/stats', methods=['GET'])
 @jwt_required()
+@etag_response
+@cached_response
 def get_stats():
     current_user = get_jwt_identity()
     user_id = current_user['id']
     days = int(request.args.get('days', 7))
     
     conn = get_db_connection()
-    start_date = (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
-    
-    data = conn.execute(
-        '''SELECT date, SUM(count) as total
-           FROM eggs
-           WHERE user_id = ? AND date >= ?
-           GROUP BY date
-           ORDER BY date''',
-        (user_id, start_date)
-    ).fetchall()
+    data = query_daily_totals(conn, user_id, days)
     conn.close()
     
     return jsonify({
         'stats': [{'date': row['date'], 'count': row['total']} for row in data]
     }), 200
 
-@app.route('/api/analytics', methods=['GET'])
+@bp.route('/api/analytics', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_analytics():
     current_user = get_jwt_identity()
     user_id = current_user['id']
     days = int(request.args.get('days', 7))
     
     conn = get_db_connection()
-    all_data = conn.execute(
-        '''SELECT date, count, notes FROM eggs 
-           WHERE user_id = ? 
-           ORDER BY date''',
-        (user_id,)
-    ).fetchall()
+    analytics = query_analytics(conn, user_id, days)
     conn.close()
     
-    if not all_data or len(all_data) < 2:
-        return jsonify({'analytics': None}), 200
-    
-    df = pd.DataFrame(all_data, columns=['date', 'count', 'notes'])
-    
-    if len(df) < days:
-        days = len(df)
-    
-    current_data = df.tail(days)
-    
-    if len(df) >= days * 2:
-        previous_data = df.iloc[-days*2:-days]
-    else:
-        previous_data = df.iloc[:-days] if len(df) > days else pd.DataFrame()
-    
-    current_counts = current_data['count'].tolist()
-    avg_current = np.mean(current_counts)
-    avg_previous = np.mean(previous_data['count']) if not previous_data.empty else 0
-    
-    if len(current_counts) > 1:
-        slope, _, _, _, _ = stats.linregress(np.arange(len(current_counts)), current_counts)
-        trend = slope * len(current_counts)
-    else:
-        trend = 0
-    
-    max_day_idx = current_data['count'].idxmax()
-    min_day_idx = current_data['count'].idxmin()
-    
-    max_day = (current_data.loc[max_day_idx, 'date'], current_data.loc[max_day_idx, 'count'])
-    min_day = (current_data.loc[min_day_idx, 'date'], current_data.loc[min_day_idx, 'count'])
+    return jsonify({'analytics': analytics}), 200
+
+@bp.route('/api/forecast', methods=['GET'])
+@jwt_required()
+@cached_response
+def get_forecast():
+    """Прогноз яйценоскости на horizon дней после последней записи"""
+    current_user = get_jwt_identity()
+    user_id = current_user['id']
+    horizon = int(request.args.get('horizon', 14))
     
-    notes = [note.lower() for note in current_data['notes'].dropna().tolist()]
-    word_analysis = {}
-    for note in notes:
-        for word in note.split():
-            if len(word) > 2:
-                word_analysis[word] = word_analysis.get(word, 0) + 1
+    if not 1 <= horizon <= MAX_HORIZON_DAYS:
+        return jsonify({'error': f'horizon должен быть от 1 до {MAX_HORIZON_DAYS}'}), 400
     
-    top_words = sorted(word_analysis.items(), key=lambda x: x[1], reverse=True)[:3]
+    conn = get_db_connection()
+    forecast = query_forecast(conn, user_id, horizon)
+    # Сохраняем обновлённую модель пользователя
+    conn.commit()
+    conn.close()
     
-    return jsonify({
-        'analytics': {
-            'current_avg': avg_current,
-            'previous_avg': avg_previous,
-            'trend': trend,
-            'max_day': max_day,
-            'min_day': min_day,
-            'top_words': top_words
-        }
-    }), 200
+    return jsonify({'forecast': forecast}), 200
 
-@app.route('/api/plot', methods=['GET'])
+@bp.route('/api/plot', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_plot():
     current_user = get_jwt_identity()
     user_id = current_user['id']
     days = int(request.args.get('days', 7))
     
     conn = get_db_connection()
-    start_date = (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
-    
-    data = conn.execute(
-        '''SELECT date, SUM(count) as total
-           FROM eggs
-           WHERE user_id = ? AND date >= ?
-           GROUP BY date
-           ORDER BY date''',
-        (user_id, start_date)
-    ).fetchall()
+    chart = query_chart(conn, user_id, days)
+    conn.close()
     
-    if not data:
-        all_data = conn.execute(
-            '''SELECT date, count FROM eggs 
-               WHERE user_id = ? 
-               ORDER BY date''',
-            (user_id,)
-        ).fetchall()
-        if all_data:
-            df = pd.DataFrame(all_data, columns=['date', 'count'])
-            if len(df) < days:
-                days = len(df)
-            recent_data = df.tail(days)
-            dates = pd.to_datetime(recent_data['date']).tolist()
-            counts = recent_data['count'].tolist()
-        else:
-            conn.close()
-            return jsonify({'error': 'Нет данных для построения графика'}), 404
-    else:
-        dates = [datetime.strptime(row['date'], "%Y-%m-%d") for row in data]
-        counts = [row['total'] for row in data]
+    if not chart:
+        return jsonify({'error': 'Нет данных для построения графика'}), 404
     
-    conn.close()
+    return Response(render_chart(chart, days), mimetype='image/png')
+
+@bp.route('/api/series', methods=['GET'])
+@jwt_required()
+@cached_response
+def get_series():
+    """Компактный временной ряд для отрисовки графика на клиенте"""
+    current_user = get_jwt_identity()
+    user_id = current_user['id']
+    days = int(request.args.get('days', 30))
+    resolution = request.args.get('resolution') or pick_resolution(days)
+    delta = request.args.get('delta') == '1'
     
-    plt.figure(figsize=(10, 6))
-    plt.plot(dates, counts, marker='o', linestyle='-', color='#ff6b6b')
-    plt.title(f'Яйценоскость за {len(dates)} дней')
-    plt.xlabel('Дата')
-    plt.ylabel('Количество яиц')
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    if resolution not in SERIES_BUCKETS:
+        return jsonify({'error': 'Допустимые значения resolution: day, week, month'}), 400
     
-    filename = f"/tmp/egg_stats_{user_id}_{days}days.png"
-    plt.savefig(filename, dpi=100)
-    plt.close()
+    conn = get_db_connection()
+    data = query_series(conn, user_id, days, resolution)
+    conn.close()
     
-    return send_from_directory('/tmp', f"egg_stats_{user_id}_{days}days.png", mimetype='image/png')
+    return jsonify({'series': build_series(data, resolution, delta)}), 200
 
-@app.route('/api/summary', methods=['GET'])
+@bp.route('/api/summary', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_summary():
     current_user = get_jwt_identity()
     user_id = current_user['id']
     
     conn = get_db_connection()
-    
-    total_eggs = conn.execute(
-        'SELECT SUM(count) FROM eggs WHERE user_id = ?',
-        (user_id,)
-    ).fetchone()[0] or 0
-    
-    records_count = conn.execute(
-        'SELECT COUNT(*) FROM eggs WHERE user_id = ?',
-        (user_id,)
-    ).fetchone()[0]
-    
+    summary = query_summary(conn, user_id)
     conn.close()
     
-    avg_per_record = total_eggs / records_count if records_count > 0 else 0
+    return jsonify(summary), 200
+
+@bp.route('/api/dashboard', methods=['GET'])
+@jwt_required()
+@cached_response
+def get_dashboard():
+    """Сводка, записи, статистика и аналитика за один запрос из одного снимка БД"""
+    current_user = get_jwt_identity()
+    user_id = current_user['id']
+    days = int(request.args.get('days', 7))
+    analytics_days = int(request.args.get('analytics_days', days))
+    include_chart = request.args.get('chart') == '1'
     
+    conn = get_db_connection()
+    try:
+        # Все чтения в одной транзакции видят согласованный снимок данных
+        conn.execute('BEGIN')
+        dashboard = {
+            'summary': query_summary(conn, user_id),
+            'records': query_records(conn, user_id),
+            'stats': [{'date': row['date'], 'count': row['total']}
+                      for row in query_daily_totals(conn, user_id, days)],
+            'analytics': query_analytics(conn, user_id, analytics_days)
+        }
+        if include_chart:
+            # Тот же прореженный ряд, что и /api/series: размер не растёт с days
+            resolution = pick_resolution(days)
+            dashboard['chart'] = build_series(query_series(conn, user_id, days, resolution), resolution)
+        conn.rollback()
+    finally:
+        conn.close()
+    
+    return jsonify(dashboard), 200
+
+@bp.route('/api/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
     return jsonify({
-        'total_eggs': total_eggs,
-        'records_count': records_count,
-        'avg_per_record': avg_per_record
+        'cache': response_cache.stats(),
+        'user_cache': user_cache.stats()
     }), 200
 
+# ==================== STATIC ASSETS ====================
+
+class StaticManifest:
+    """Файлы React-сборки, прочитанные и сжатые один раз при старте.
+
+    Запрос к статике - поиск в словаре без обращений к файловой системе.
+    Готовые .gz/.br рядом с файлом используются как есть.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.files = {}
+        if os.path.isdir(root):
+            self._build()
+
+    def _build(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(('.gz', '.br')):
+                    continue
+                full_path = os.path.join(dirpath, name)
+                rel_path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    body = f.read()
+                mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                self.files[rel_path] = {
+                    'body': body,
+                    'mimetype': mimetype,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    # Файлы из static/ содержат хэш в имени и никогда не меняются
+                    'immutable': rel_path.startswith('static/'),
+                    'variants': self._variants(full_path, body, mimetype)
+                }
+
+    def _variants(self, full_path, body, mimetype):
+        variants = {}
+        if mimetype not in COMPRESSIBLE_MIMETYPES or len(body) < COMPRESS_MIN_SIZE:
+            return variants
+        for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+            if os.path.exists(full_path + ext):
+                with open(full_path + ext, 'rb') as f:
+                    variants[encoding] = f.read()
+            elif encoding == 'gzip' or brotli is not None:
+                variants[encoding] = compress_body(body, encoding, best=True)
+        return variants
+
+    def get(self, path):
+        return self.files.get(path)
+
 # Serve React app
-@app.route('/')
-@app.route('/<path:path>')
+@bp.route('/')
+@bp.route('/<path:path>')
 def serve(path=''):
-    if path and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    return send_from_directory(app.static_folder, 'index.html')
+    manifest = current_app.extensions['static_manifest']
+    entry = manifest.get(path) or manifest.get('index.html')
+    if entry is None:
+        return jsonify({'error': 'Фронтенд не собран'}), 404
+    
+    encoding = choose_encoding() if entry['variants'] else None
+    body = entry['variants'].get(encoding)
+    if body is None:
+        body, encoding = entry['body'], None
+    
+    etag = entry['etag'] + (f'-{encoding}' if encoding else '')
+    if not_modified(entry['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=entry['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    if entry['variants']:
+        response.vary.add('Accept-Encoding')
+    if entry['immutable']:
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
 
-if __name__ == '__main__':
+def create_app():
+    """Фабрика приложения для gunicorn (app:create_app()) и локального запуска"""
+    # Встроенный static-маршрут Flask отключён: статику отдаёт serve() из манифеста
+    app = Flask(__name__, static_folder=None)
+    app.extensions['static_manifest'] = StaticManifest(os.path.join(app.root_path, FRONTEND_BUILD))
+    # За nginx адрес клиента приходит в X-Forwarded-For
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('PROXY_FIX_X_FOR', 1)))
+    CORS(app)
+    
+    # Конфигурация JWT
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
+    jwt.init_app(app)
+    
+    app.register_blueprint(bp)
     init_db()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if isinstance(rate_limit_store, SQLiteRateLimitStore):
+        rate_limit_store.init_schema()
+    return app
+
+if __name__ == '__main__':
+    # Только для локальной разработки, в контейнере приложение запускает gunicorn
+    create_app().run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG') == '1')
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import {
@@ -55,6 +55,7 @@ import {
   DonutLarge as DonutLargeIcon,
 } from '@mui/icons-material';
 import { useAuth } from '../contexts/AuthContext';
+import EggChart, { decodeSeries } from './EggChart';
 
 const drawerWidth = 240;
 
@@ -67,7 +68,7 @@ const Dashboard = () => {
   const [records, setRecords] = useState([]);
   const [stats, setStats] = useState([]);
   const [analytics, setAnalytics] = useState(null);
-  const [plotUrl, setPlotUrl] = useState('');
+  const [chartPoints, setChartPoints] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [snackbar, setSnackbar] = useState({ open: false, message: '', severity: 'success' });
@@ -89,6 +90,8 @@ const Dashboard = () => {
   const [analyticsDays, setAnalyticsDays] = useState(30);
   const [plotDays, setPlotDays] = useState(30);
 
+  const dashboardLoaded = useRef(false);
+
   const { user, logout } = useAuth();
   const navigate = useNavigate();
 
@@ -98,6 +101,20 @@ const Dashboard = () => {
     setSnackbar({ open: true, message, severity });
   };
 
+  const fetchDashboard = async () => {
+    try {
+      const response = await axios.get(`${API_URL}/api/dashboard`, {
+        params: { days: 7, analytics_days: analyticsDays }
+      });
+      setSummary(response.data.summary);
+      setRecords(response.data.records);
+      setStats(response.data.stats);
+      setAnalytics(response.data.analytics);
+    } catch (err) {
+      console.error('Error fetching dashboard:', err);
+    }
+  };
+
   const fetchSummary = async () => {
     try {
       const response = await axios.get(`${API_URL}/api/summary`);
@@ -141,24 +158,27 @@ const Dashboard = () => {
 
   const fetchPlot = async (days = 30) => {
     try {
-      const response = await axios.get(`${API_URL}/api/plot`, { 
-        params: { days },
-        responseType: 'blob'
+      const response = await axios.get(`${API_URL}/api/series`, {
+        params: { days, delta: 1 }
       });
-      const url = URL.createObjectURL(response.data);
-      setPlotUrl(url);
+      const { series } = response.data;
+      setChartPoints(series ? decodeSeries(series) : []);
     } catch (err) {
-      console.error('Error fetching plot:', err);
-      setPlotUrl('');
+      console.error('Error fetching series:', err);
+      setChartPoints([]);
     }
   };
 
   useEffect(() => {
-    fetchSummary();
-    fetchRecords();
+    fetchDashboard();
   }, []);
 
   useEffect(() => {
+    // Первая загрузка уже пришла одним запросом /api/dashboard
+    if (!dashboardLoaded.current) {
+      dashboardLoaded.current = true;
+      return;
+    }
     if (selectedView === 'records') {
       fetchRecords();
     } else if (selectedView === 'stats') {
@@ -464,8 +484,8 @@ const Dashboard = () => {
                 Обновить график
               </Button>
             </Box>
-            {plotUrl ? (
-              <Box component="img" src={plotUrl} alt="Egg production chart" sx={{ maxWidth: '100%' }} />
+            {chartPoints.length > 0 ? (
+              <EggChart points={chartPoints} />
             ) : (
               <Typography color="text.secondary">Нет данных для построения графика</Typography>
             )}
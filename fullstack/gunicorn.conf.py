@@ -0,0 +1,55 @@
+# Конфигурация gunicorn для продакшена: gunicorn -c gunicorn.conf.py "app:create_app()"
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Процессы дают параллелизм по ядрам, потоки - по ожиданию SQLite и сети
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Приложение загружается один раз в мастере и достаётся воркерам через fork.
+# Вместе с ним в мастере загружаются numpy, scipy и matplotlib (on_starting):
+# воркеры делят их страницы copy-on-write и не платят за импорт на первом
+# запросе и после каждого перезапуска по max_requests
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Плавный перезапуск воркеров, чтобы не копилась память
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Метрики воркеров складываются через общий каталог: запрос /metrics попадает
+# в случайный воркер, и без этого каждый отвечал бы только своими значениями
+metrics_dir = os.getenv('METRICS_MULTIPROC_DIR', '/tmp/tenhens-metrics')
+
+
+def on_starting(server):
+    from tenhens_core import lazy, metrics
+    metrics.clear_multiprocess_dir(metrics_dir)
+    if preload_app:
+        lazy.preload()
+
+
+def post_fork(server, worker):
+    from tenhens_core import metrics
+    metrics.enable_multiprocess(metrics_dir)
+
+
+def worker_exit(server, worker):
+    from tenhens_core import metrics
+    metrics.flush()
+
+
+def child_exit(server, worker):
+    from tenhens_core import metrics
+    metrics.mark_process_dead(metrics_dir, worker.pid)
+
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
@@ -1,26 +1,73 @@
 import streamlit as st
 import sqlite3
-import hashlib
-import matplotlib.pyplot as plt
-import numpy as np
-from scipy import stats
+import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-import pandas as pd
+
+from tenhens_core import metrics, storage
+from tenhens_core.analytics import compute_analytics
+# pandas загружается при первом открытии таблицы записей: страницы входа
+# и регистрации открываются без него
+from tenhens_core.lazy import pd
+from tenhens_core.rendering import query_chart, render_chart
+from tenhens_core.security import hash_password, verify_password, verify_missing_user
 
 # Настройки базы данных
 DB_NAME = "/app/data/egg_database.db"
 # DB_NAME = "../chicken_bot/data/egg_database.db"
+
+# Кэш данных пользователя: ключ включает версию данных из БД, которую увеличивает
+# любая запись в eggs из веб-приложения, бота или Streamlit; TTL ограничивает память
+DATA_CACHE_TTL_SECONDS = int(os.getenv('DATA_CACHE_TTL_SECONDS', 60))
+DATA_CACHE_MAX_ENTRIES = int(os.getenv('DATA_CACHE_MAX_ENTRIES', 1000))
+# Сколько записей показывается на одной странице таблицы
+RECORDS_PAGE_SIZE = int(os.getenv('RECORDS_PAGE_SIZE', 50))
+
+# Порт для /metrics (время SQL-запросов); 0 отключает
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9102))
+
+@st.cache_resource
+def start_metrics_server():
+    """Один сервер метрик на процесс Streamlit"""
+    if METRICS_PORT:
+        return metrics.serve_metrics(METRICS_HOST, METRICS_PORT)
+    return None
+
+@st.cache_resource
+def get_db():
+    """Одно соединение на процесс Streamlit вместо нового на каждый запрос"""
+    conn = storage.connect(DB_NAME, check_same_thread=False)
+    return conn, threading.Lock()
+
+@contextmanager
+def db_cursor(commit=False):
+    """Курсор общего соединения; сессии работают в разных потоках, поэтому под блокировкой"""
+    conn, lock = get_db()
+    with lock:
+        c = conn.cursor()
+        try:
+            yield c
+            if commit:
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            c.close()
+
+def data_version(user_id):
+    with db_cursor() as c:
+        return storage.get_data_version(c, user_id)
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS eggs
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  date TEXT,
-                  count INTEGER,
-                  notes TEXT)''')
-                  
+    with db_cursor(commit=True) as c:
+        # Записи о яйценоскости и версии данных - общие для всех приложений
+        storage.init_schema(c)
+        _create_tables(c)
+
+def _create_tables(c):
     c.execute('''CREATE TABLE IF NOT EXISTS streamlit_users
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                   username TEXT UNIQUE,
@@ -28,272 +75,126 @@ def init_db():
                   password TEXT,
                   security_question TEXT,
                   security_answer TEXT)''')
-    conn.commit()
-    conn.close()
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
 
 def register_user(username, telegram_id, password, security_question, security_answer):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     hashed_password = hash_password(password)
     hashed_answer = hash_password(security_answer.lower().strip())
-    c.execute("""INSERT INTO streamlit_users 
-                 (username, telegram_id, password, security_question, security_answer) 
-                 VALUES (?, ?, ?, ?, ?)""",
-              (username, telegram_id, hashed_password, security_question, hashed_answer))
-    conn.commit()
-    conn.close()
+    with db_cursor(commit=True) as c:
+        c.execute("""INSERT INTO streamlit_users 
+                     (username, telegram_id, password, security_question, security_answer) 
+                     VALUES (?, ?, ?, ?, ?)""",
+                  (username, telegram_id, hashed_password, security_question, hashed_answer))
 
 def authenticate_user(username, password):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT password, telegram_id FROM streamlit_users WHERE username = ?", (username,))
-    result = c.fetchone()
-    conn.close()
-    if result and hash_password(password) == result[0]:
+    with db_cursor() as c:
+        c.execute("SELECT password, telegram_id FROM streamlit_users WHERE username = ?", (username,))
+        result = c.fetchone()
+    if result:
+        ok, needs_rehash = verify_password(password, result[0])
+    else:
+        ok, needs_rehash = verify_missing_user(password)
+    # Прозрачная миграция старых хэшей и хэшей с устаревшей стоимостью
+    if needs_rehash:
+        hashed_password = hash_password(password)
+        with db_cursor(commit=True) as c:
+            c.execute("UPDATE streamlit_users SET password = ? WHERE username = ?",
+                      (hashed_password, username))
+    if ok:
         st.session_state['telegram_id'] = result[1]
         return True
     return False
 
 def reset_password(username, new_password):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     hashed_password = hash_password(new_password)
-    c.execute("UPDATE streamlit_users SET password = ? WHERE username = ?",
-              (hashed_password, username))
-    conn.commit()
-    conn.close()
+    with db_cursor(commit=True) as c:
+        c.execute("UPDATE streamlit_users SET password = ? WHERE username = ?",
+                  (hashed_password, username))
 
 def verify_security_answer(username, answer):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT security_question, security_answer FROM streamlit_users WHERE username = ?", (username,))
-    result = c.fetchone()
-    conn.close()
-    if result and hash_password(answer.lower().strip()) == result[1]:
+    with db_cursor() as c:
+        c.execute("SELECT security_question, security_answer FROM streamlit_users WHERE username = ?", (username,))
+        result = c.fetchone()
+    answer = answer.lower().strip()
+    if result:
+        ok, needs_rehash = verify_password(answer, result[1])
+    else:
+        ok, needs_rehash = verify_missing_user(answer)
+    if needs_rehash:
+        hashed_answer = hash_password(answer)
+        with db_cursor(commit=True) as c:
+            c.execute("UPDATE streamlit_users SET security_answer = ? WHERE username = ?",
+                      (hashed_answer, username))
+    if ok:
         return result[0]
     return None
 
+def get_security_question(username):
+    """Получить секретный вопрос пользователя"""
+    with db_cursor() as c:
+        c.execute("SELECT security_question FROM streamlit_users WHERE username = ?", (username,))
+        result = c.fetchone()
+    return result[0] if result else None
+
 def get_user_data(telegram_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, date, count, notes FROM eggs WHERE user_id = ? ORDER BY date DESC", (telegram_id,))
-    data = c.fetchall()
-    conn.close()
-    return data
-
-def get_all_records_with_id(telegram_id):
+    with db_cursor() as c:
+        c.execute("SELECT id, date, count, notes FROM eggs WHERE user_id = ? ORDER BY date DESC", (telegram_id,))
+        return c.fetchall()
+
+@st.cache_data(ttl=DATA_CACHE_TTL_SECONDS, max_entries=DATA_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_all_records_with_id(telegram_id, version=0):
     """Получить все записи пользователя с ID для отображения"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, date, count, notes FROM eggs WHERE user_id = ? ORDER BY date DESC, id DESC", (telegram_id,))
-    data = c.fetchall()
-    conn.close()
-    return data
+    with db_cursor() as c:
+        c.execute("SELECT id, date, count, notes FROM eggs WHERE user_id = ? ORDER BY date DESC, id DESC", (telegram_id,))
+        return c.fetchall()
 
 def add_egg_record(user_id, date, count, notes=""):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO eggs (user_id, date, count, notes) VALUES (?, ?, ?, ?)",
-              (user_id, date, count, notes))
-    conn.commit()
-    conn.close()
-
-def delete_record(record_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM eggs WHERE id=?", (record_id,))
-    conn.commit()
-    conn.close()
-
-def update_record(record_id, count=None, date=None, notes=None):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    updates = []
-    params = []
-    if count is not None:
-        updates.append("count = ?")
-        params.append(count)
-    if date is not None:
-        updates.append("date = ?")
-        params.append(date)
-    if notes is not None:
-        updates.append("notes = ?")
-        params.append(notes)
-    if updates:
-        query = f"UPDATE eggs SET {', '.join(updates)} WHERE id = ?"
-        params.append(record_id)
-        c.execute(query, params)
-        conn.commit()
-    conn.close()
-
-def get_record_by_id(record_id):
-    """Получить запись по ID"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, user_id, date, count, notes FROM eggs WHERE id = ?", (record_id,))
-    result = c.fetchone()
-    conn.close()
-    return result
-
-def get_stats(user_id, days=7):
-    """Получить статистику за указанный период"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Получаем начальную дату
-    start_date = (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
-    
-    # Получаем данные за период
-    c.execute('''SELECT date, SUM(count)
-                 FROM eggs
-                 WHERE user_id = ? AND date >= ?
-                 GROUP BY date
-                 ORDER BY date''', (user_id, start_date))
-    data = c.fetchall()
-    
-    conn.close()
-    return data
-
-def get_total_eggs(user_id):
-    """Получить общее количество яиц для пользователя"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''SELECT SUM(count) FROM eggs WHERE user_id = ?''', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result[0] is not None else 0
-
-def get_egg_records_count(user_id):
-    """Получить количество записей пользователя"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''SELECT COUNT(*) FROM eggs WHERE user_id = ?''', (user_id,))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result[0] is not None else 0
-
-def get_all_user_records(user_id):
-    """Получить все записи пользователя для аналитики"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''SELECT date, count, notes FROM eggs WHERE user_id = ? ORDER BY date''', (user_id,))
-    data = c.fetchall()
-    conn.close()
-    return data
-
-def generate_plot(user_id, days=7):
-    """Сгенерировать график яйценоскости"""
-    data = get_stats(user_id, days)
-    if not data:
-        # Если нет данных за период, попробуем получить все данные пользователя
-        all_data = get_all_user_records(user_id)
-        if not all_data:
-            return None
-        
-        # Преобразуем все данные в DataFrame для удобства
-        df = pd.DataFrame(all_data, columns=['date', 'count', 'notes'])
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Если данных меньше чем days, используем все доступные данные
-        if len(df) < days:
-            days = len(df)
-        
-        # Берем последние days записей
-        recent_data = df.tail(days)
-        dates = recent_data['date'].tolist()
-        counts = recent_data['count'].tolist()
-    else:
-        dates = [datetime.strptime(row[0], "%Y-%m-%d") for row in data]
-        counts = [row[1] for row in data]
-    
-    plt.figure(figsize=(10, 6))
-    plt.plot(dates, counts, marker='o', linestyle='-', color='#ff6b6b')
-    plt.title(f'Яйценоскость за {len(dates)} дней')
-    plt.xlabel('Дата')
-    plt.ylabel('Количество яиц')
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    filename = f"egg_stats_{user_id}_{days}days.png"
-    plt.savefig(filename, dpi=100)
-    plt.close()
-    return filename
-
-def calculate_analytics(user_id, days=7):
+    with db_cursor(commit=True) as c:
+        storage.add_record(c, user_id, date, count, notes)
+
+@st.cache_data(ttl=DATA_CACHE_TTL_SECONDS, max_entries=DATA_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_records_frame(telegram_id, version=0):
+    """Записи пользователя в DataFrame; даты разбираются один раз и кэшируются вместе с таблицей"""
+    df = pd.DataFrame(get_all_records_with_id(telegram_id, version),
+                      columns=['ID', 'Дата', 'Количество', 'Заметки'])
+    df['Дата'] = pd.to_datetime(df['Дата'])
+    df['Заметки'] = df['Заметки'].fillna('')
+    return df
+
+def apply_record_changes(user_id, updates, deleted_ids):
+    """Применить правки из таблицы одной транзакцией.
+
+    updates - список (date, count, notes, id), deleted_ids - список id
+    """
+    if not updates and not deleted_ids:
+        return
+    with db_cursor(commit=True) as c:
+        storage.apply_record_changes(c, user_id, updates, deleted_ids)
+
+@st.cache_data(ttl=DATA_CACHE_TTL_SECONDS, max_entries=DATA_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_user_summary(user_id, version=0):
+    """Получить общее количество яиц и число записей пользователя одним запросом"""
+    with db_cursor() as c:
+        summary = storage.query_summary(c, user_id)
+    return summary['total_eggs'], summary['records_count']
+
+@st.cache_data(ttl=DATA_CACHE_TTL_SECONDS, max_entries=DATA_CACHE_MAX_ENTRIES, show_spinner=False)
+def generate_plot(user_id, days=7, version=0):
+    """Сгенерировать график яйценоскости, возвращает PNG в байтах"""
+    with db_cursor() as c:
+        chart = query_chart(c, user_id, days)
+    # График строится вне блокировки соединения
+    return render_chart(chart, days) if chart else None
+
+@st.cache_data(ttl=DATA_CACHE_TTL_SECONDS, max_entries=DATA_CACHE_MAX_ENTRIES, show_spinner=False)
+def calculate_analytics(user_id, days=7, version=0):
     """Рассчитать аналитику по яйценоскости"""
-    # Получаем все данные пользователя
-    all_data = get_all_user_records(user_id)
-    if not all_data or len(all_data) < 2:
-        return None
-    
-    # Преобразуем в DataFrame
-    df = pd.DataFrame(all_data, columns=['date', 'count', 'notes'])
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Если данных меньше чем days, используем все доступные данные
-    if len(df) < days:
-        days = len(df)
-    
-    # Берем последние days записей для текущего периода
-    current_data = df.tail(days)
-    
-    # Берем предыдущие days записей для сравнения (если есть)
-    if len(df) >= days * 2:
-        previous_data = df.iloc[-days*2:-days]
-    else:
-        # Если нет достаточного количества данных для сравнения, берем все что есть до текущего периода
-        previous_data = df.iloc[:-days] if len(df) > days else pd.DataFrame()
-    
-    # Рассчитываем статистики
-    current_counts = current_data['count'].tolist()
-    avg_current = np.mean(current_counts)
-    
-    if not previous_data.empty:
-        avg_previous = np.mean(previous_data['count'])
-    else:
-        avg_previous = 0
-    
-    # Рассчитываем тренд
-    if len(current_counts) > 1:
-        x = np.arange(len(current_counts))
-        slope, _, _, _, _ = stats.linregress(x, current_counts)
-        trend = slope * len(current_counts)
-    else:
-        trend = 0
-    
-    # Находим дни с максимальным и минимальным количеством яиц
-    max_day_idx = current_data['count'].idxmax()
-    min_day_idx = current_data['count'].idxmin()
-    
-    max_day = (current_data.loc[max_day_idx, 'date'].strftime("%Y-%m-%d"), 
-               current_data.loc[max_day_idx, 'count'])
-    min_day = (current_data.loc[min_day_idx, 'date'].strftime("%Y-%m-%d"), 
-               current_data.loc[min_day_idx, 'count'])
-    
-    # Анализ заметок
-    notes = [note.lower() for note in current_data['notes'].dropna().tolist()]
-    word_analysis = {}
-    for note in notes:
-        for word in note.split():
-            if len(word) > 2:  # Игнорируем короткие слова
-                word_analysis[word] = word_analysis.get(word, 0) + 1
-    
-    top_words = sorted(word_analysis.items(), key=lambda x: x[1], reverse=True)[:3]
-    
-    return {
-        'current_avg': avg_current,
-        'previous_avg': avg_previous,
-        'trend': trend,
-        'max_day': max_day,
-        'min_day': min_day,
-        'top_words': top_words
-    }
+    with db_cursor() as c:
+        records = storage.query_all_records(c, user_id)
+    return compute_analytics(records, days)
 
 # Остальной код остается без изменений...
 init_db()
+start_metrics_server()
 st.set_page_config(
     page_title="Десять курочек | Сервис для учёта яйценоскости", 
     page_icon="🐔",
@@ -464,14 +365,9 @@ if not st.session_state.get('logged_in'):
         username = st.text_input("Введите ваше имя пользователя")
         
         if username:
-            conn = sqlite3.connect(DB_NAME)
-            c = conn.cursor()
-            c.execute("SELECT security_question FROM streamlit_users WHERE username = ?", (username,))
-            result = c.fetchone()
-            conn.close()
+            question = get_security_question(username)
             
-            if result:
-                question = result[0]
+            if question:
                 answer = st.text_input(f"Введите ответ на вопрос: '{question}'")
                 new_password = st.text_input("Новый пароль", type="password")
                 
@@ -491,8 +387,8 @@ if not st.session_state.get('logged_in'):
 
 else:
     # Получаем статистику пользователя для сайдбара
-    total_eggs = get_total_eggs(st.session_state['telegram_id'])
-    records_count = get_egg_records_count(st.session_state['telegram_id'])
+    version = data_version(st.session_state['telegram_id'])
+    total_eggs, records_count = get_user_summary(st.session_state['telegram_id'], version)
     
     # Отображаем информацию в сайдбаре
     st.sidebar.subheader(f"👋 Добро пожаловать, {st.session_state['username']}!")
@@ -578,15 +474,12 @@ else:
                     else:
                         st.error("Укажите количество яиц")
         
-        # Получаем все записи пользователя с ID
-        records = get_all_records_with_id(st.session_state['telegram_id'])
+        # Записи пользователя с уже разобранными датами
+        df = get_records_frame(st.session_state['telegram_id'], version)
         
-        if records:
-            # Создаем DataFrame для красивого отображения
-            df = pd.DataFrame(records, columns=['ID', 'Дата', 'Количество', 'Заметки'])
-            
+        if not df.empty:
             # Показываем общее количество записей
-            st.info(f"Всего записей: {len(records)}")
+            st.info(f"Всего записей: {len(df)}")
             
             # Добавляем фильтры
             st.subheader("🔍 Фильтры и поиск")
@@ -602,106 +495,68 @@ else:
                 search_notes = st.text_input("Поиск по заметкам", key="search_notes")
             
             # Фильтруем данные
-            filtered_df = df[
-                (pd.to_datetime(df['Дата']) >= pd.to_datetime(min_date)) & 
-                (pd.to_datetime(df['Дата']) <= pd.to_datetime(max_date))
-            ]
-            
+            mask = df['Дата'].between(pd.Timestamp(min_date), pd.Timestamp(max_date))
             if search_notes:
-                filtered_df = filtered_df[filtered_df['Заметки'].str.contains(search_notes, case=False, na=False)]
+                mask &= df['Заметки'].str.contains(search_notes, case=False, regex=False)
+            filtered_df = df[mask]
             
             st.write(f"Найдено записей: {len(filtered_df)}")
             
-            # Отображаем таблицу с записями
-            for index, row in filtered_df.iterrows():
-                with st.container():
-                    col1, col2, col3, col4, col5 = st.columns([1, 2, 2, 4, 3])
-                    
-                    with col1:
-                        st.write(f"**{row['ID']}**")
-                    
-                    with col2:
-                        st.write(row['Дата'])
-                    
-                    with col3:
-                        st.write(f"{row['Количество']} 🥚")
-                    
-                    with col4:
-                        st.write(row['Заметки'] if row['Заметки'] else "-")
-                    
-                    with col5:
-                        # Кнопки действий для каждой записи
-                        edit_key = f"edit_{row['ID']}"
-                        delete_key = f"delete_{row['ID']}"
-                        
-                        col_edit, col_del = st.columns(2)
-                        with col_edit:
-                            if st.button("✏️", key=edit_key, help="Редактировать запись"):
-                                st.session_state[f'editing_{row["ID"]}'] = True
-                        
-                        with col_del:
-                            if st.button("🗑️", key=delete_key, help="Удалить запись"):
-                                st.session_state[f'deleting_{row["ID"]}'] = True
-                    
-                    # Форма редактирования для этой записи
-                    if st.session_state.get(f'editing_{row["ID"]}'):
-                        with st.expander(f"Редактирование записи #{row['ID']}", expanded=True):
-                            record_data = get_record_by_id(row['ID'])
-                            if record_data:
-                                edit_col1, edit_col2, edit_col3 = st.columns([2, 2, 4])
-                                
-                                with edit_col1:
-                                    edit_date = st.date_input("Дата", 
-                                                             value=datetime.strptime(record_data[2], "%Y-%m-%d"),
-                                                             key=f"edit_date_{row['ID']}")
-                                
-                                with edit_col2:
-                                    edit_count = st.number_input("Количество", 
-                                                                min_value=0, 
-                                                                value=record_data[3],
-                                                                key=f"edit_count_{row['ID']}")
-                                
-                                with edit_col3:
-                                    edit_notes = st.text_input("Заметки", 
-                                                              value=record_data[4] if record_data[4] else "",
-                                                              key=f"edit_notes_{row['ID']}")
-                                
-                                col_save, col_cancel = st.columns(2)
-                                with col_save:
-                                    if st.button("💾 Сохранить", key=f"save_{row['ID']}"):
-                                        update_record(row['ID'], edit_count, edit_date.strftime("%Y-%m-%d"), edit_notes)
-                                        st.success("✅ Запись успешно обновлена!")
-                                        st.session_state[f'editing_{row["ID"]}'] = False
-                                        st.rerun()
-                                
-                                with col_cancel:
-                                    if st.button("❌ Отмена", key=f"cancel_{row['ID']}"):
-                                        st.session_state[f'editing_{row["ID"]}'] = False
-                                        st.rerun()
-                    
-                    # Подтверждение удаления
-                    if st.session_state.get(f'deleting_{row["ID"]}'):
-                        with st.expander(f"Подтверждение удаления записи #{row['ID']}", expanded=True):
-                            st.warning("Вы уверены, что хотите удалить эту запись? Это действие нельзя отменить!")
-                            
-                            col_confirm, col_cancel_del = st.columns(2)
-                            with col_confirm:
-                                if st.button("✅ Да, удалить", key=f"confirm_del_{row['ID']}"):
-                                    delete_record(row['ID'])
-                                    st.success("✅ Запись успешно удалена!")
-                                    st.session_state[f'deleting_{row["ID"]}'] = False
-                                    st.rerun()
-                            
-                            with col_cancel_del:
-                                if st.button("❌ Отмена", key=f"cancel_del_{row['ID']}"):
-                                    st.session_state[f'deleting_{row["ID"]}'] = False
-                                    st.rerun()
-                    
-                    st.markdown("---")
+            # Постраничный вывод: на экране не больше RECORDS_PAGE_SIZE строк
+            pages = max(1, -(-len(filtered_df) // RECORDS_PAGE_SIZE))
+            page = st.number_input(f"Страница (из {pages})", min_value=1, max_value=pages, value=1)
+            start = (page - 1) * RECORDS_PAGE_SIZE
+            page_df = filtered_df.iloc[start:start + RECORDS_PAGE_SIZE].assign(Удалить=False)
+            # Правки редактора привязаны к позициям строк, поэтому ключ меняется вместе со страницей
+            editor_key = f"records_editor_{version}_{page}_{min_date}_{max_date}_{search_notes}"
+            
+            edited_df = st.data_editor(
+                page_df,
+                key=editor_key,
+                hide_index=True,
+                num_rows="fixed",
+                use_container_width=True,
+                disabled=['ID'],
+                column_config={
+                    'Дата': st.column_config.DateColumn("Дата", format="YYYY-MM-DD", required=True),
+                    'Количество': st.column_config.NumberColumn("Количество 🥚", min_value=0, step=1, required=True),
+                    'Заметки': st.column_config.TextColumn("Заметки"),
+                    'Удалить': st.column_config.CheckboxColumn("🗑️ Удалить"),
+                },
+            )
+            
+            # Разница между страницей и отредактированной таблицей считается по столбцам целиком
+            edited_df['Дата'] = pd.to_datetime(edited_df['Дата'])
+            edited_df['Заметки'] = edited_df['Заметки'].fillna('')
+            to_delete = edited_df['Удалить']
+            changed = (
+                (edited_df['Дата'] != page_df['Дата'])
+                | (edited_df['Количество'] != page_df['Количество'])
+                | (edited_df['Заметки'] != page_df['Заметки'])
+            ) & ~to_delete
+            
+            if changed.any() or to_delete.any():
+                st.warning(f"Изменено записей: {int(changed.sum())}, к удалению: {int(to_delete.sum())}")
+                col_save, col_cancel = st.columns(2)
+                with col_save:
+                    if st.button("💾 Сохранить изменения", key="save_records"):
+                        rows = edited_df[changed]
+                        updates = list(zip(rows['Дата'].dt.strftime("%Y-%m-%d"),
+                                           rows['Количество'].astype(int).tolist(),
+                                           rows['Заметки'].tolist(),
+                                           rows['ID'].tolist()))
+                        apply_record_changes(st.session_state['telegram_id'], updates,
+                                             edited_df.loc[to_delete, 'ID'].tolist())
+                        st.success("✅ Изменения сохранены!")
+                        st.rerun()
+                with col_cancel:
+                    if st.button("❌ Отменить изменения", key="cancel_records"):
+                        del st.session_state[editor_key]
+                        st.rerun()
             
             # Экспорт данных
             st.subheader("📤 Экспорт данных")
-            csv = filtered_df.to_csv(index=False).encode('utf-8')
+            csv = filtered_df.assign(Дата=filtered_df['Дата'].dt.strftime("%Y-%m-%d")).to_csv(index=False).encode('utf-8')
             st.download_button(
                 label="Скачать отфильтрованные данные в CSV",
                 data=csv,
@@ -715,7 +570,7 @@ else:
     elif action == "Аналитика":
         st.subheader("📈 Аналитика")
         days = st.slider("Анализируемый период (дней)", min_value=7, max_value=90, value=30, key="analytics_days")
-        analytics = calculate_analytics(st.session_state['telegram_id'], days)
+        analytics = calculate_analytics(st.session_state['telegram_id'], days, version)
         
         if analytics:
             col1, col2 = st.columns(2)
@@ -745,17 +600,16 @@ else:
 
     elif action == "График":
         st.subheader("📈 График яйценоскости")
-        days = st.slider("Период отображения (дней)", min_value=7, max_value=180, value=30, key="plot_days")
-        filename = generate_plot(st.session_state['telegram_id'], days)
-        if filename:
-            st.image(filename)
-            with open(filename, "rb") as file:
-                st.download_button(
-                    label="Скачать график",
-                    data=file,
-                    file_name=f"egg_production_{days}_days.png",
-                    mime="image/png"
-                )
+        days = st.slider("Период отображения (дней)", min_value=7, max_value=1825, value=30, key="plot_days")
+        image = generate_plot(st.session_state['telegram_id'], days, version)
+        if image:
+            st.image(image)
+            st.download_button(
+                label="Скачать график",
+                data=image,
+                file_name=f"egg_production_{days}_days.png",
+                mime="image/png"
+            )
         else:
             st.warning("Нет данных для построения графика. Добавьте записи о яйценоскости.")
 